@@ -0,0 +1,51 @@
+import io
+import re
+import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pacsv
+from flask import Blueprint, request
+from utils.ClusterPipeline import SCALERS, assign_clusters, load_model
+from utils.Streaming import numeric_values
+
+DATASET_ID = re.compile(r"^[0-9a-f]{32}$")
+
+cluster_blueprint = Blueprint("cluster", __name__, url_prefix="/api/cluster")
+
+
+@cluster_blueprint.post("/<datasetId>/assign")
+def assignRows(datasetId):
+    """
+    Assign the rows of a posted CSV (a `file` field or the raw body) to the
+    k-means clusters last shown for the dataset, `k` and `scaling` come from
+    the query string. Rows missing a feature get cluster -1.
+    """
+    k = request.args.get("k", type=int)
+    scaling = request.args.get("scaling", "standard")
+    if not DATASET_ID.match(datasetId) or k is None:
+        return {"error": "Invalid dataset id or k"}, 400
+    if scaling not in SCALERS:
+        return {"error": f"scaling must be one of {list(SCALERS)}"}, 400
+    model = load_model(datasetId, scaling, k)
+    if model is None:
+        return {"error": "No clustering saved for this dataset and k"}, 404
+
+    upload = request.files.get("file")
+    raw = upload.read() if upload else request.get_data()
+    columns = model["columns"].tolist()
+    try:
+        table = pacsv.read_csv(
+            io.BytesIO(raw),
+            convert_options=pacsv.ConvertOptions(include_columns=columns),
+        )
+        X = np.column_stack([numeric_values(table.column(col)) for col in columns])
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError, KeyError) as e:
+        return {"error": f"Rows need the numeric columns {columns}: {e}"}, 400
+
+    labels, distances = assign_clusters(model, X)
+    return {
+        "datasetId": datasetId,
+        "k": k,
+        "scaling": scaling,
+        "clusters": labels.tolist(),
+        "distances": [None if np.isnan(d) else float(d) for d in distances],
+    }
@@ -0,0 +1,133 @@
+import os
+import re
+import fcntl
+import shutil
+from contextlib import contextmanager
+from flask import Blueprint, request
+from utils.DatasetStore import evict_lru
+
+# Files picked in a ChunkedUpload component are streamed here in chunks
+# instead of going through the callbacks as base64 data URLs
+UPLOAD_DIR = os.path.join("./cache", "uploads")
+UPLOAD_SIZE_LIMIT = int(os.environ.get("UPLOAD_CACHE_BYTES", 4 * 1024**3))
+UPLOAD_ID = re.compile(r"^[A-Za-z0-9_-]{8,64}$")
+
+os.makedirs(UPLOAD_DIR, exist_ok=True)
+
+upload_blueprint = Blueprint("upload", __name__, url_prefix="/api/upload")
+
+
+def partPath(uploadId: str):
+    return os.path.join(UPLOAD_DIR, f"{uploadId}.part")
+
+
+def uploadPath(uploadId: str):
+    """Path of a finished upload, None for unknown or evicted uploads"""
+    if not uploadId or not UPLOAD_ID.match(uploadId):
+        return None
+    path = os.path.join(UPLOAD_DIR, f"{uploadId}.upload")
+    if not os.path.exists(path):
+        return None
+    os.utime(path)  # mark as recently used for eviction
+    return path
+
+
+def receivedBytes(uploadId: str):
+    path = partPath(uploadId)
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+@contextmanager
+def lockedPart(uploadId: str):
+    """
+    Partial upload opened for appending and locked against other requests
+    for the same upload. Yields None when the file was completed or evicted
+    while waiting for the lock.
+    """
+    path = partPath(uploadId)
+    with open(path, "ab") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            current = os.stat(path) if os.path.exists(path) else None
+            if current is None or not os.path.samestat(current, os.fstat(f.fileno())):
+                yield None
+            else:
+                f.seek(0, os.SEEK_END)
+                yield f
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def evictUploads(keep: str):
+    """Finished and abandoned partial uploads share the upload cache limit"""
+    evict_lru(UPLOAD_DIR, (".upload", ".part"), UPLOAD_SIZE_LIMIT, keep=keep)
+
+
+@upload_blueprint.get("/<uploadId>")
+def uploadStatus(uploadId):
+    """Where the client should resume, or the finished upload"""
+    if not UPLOAD_ID.match(uploadId):
+        return {"error": "Invalid upload id"}, 400
+    path = uploadPath(uploadId)
+    if path:
+        size = os.path.getsize(path)
+        return {"uploadId": uploadId, "offset": size, "size": size, "complete": True}
+    return {"uploadId": uploadId, "offset": receivedBytes(uploadId), "complete": False}
+
+
+@upload_blueprint.post("/<uploadId>")
+def uploadChunk(uploadId):
+    """Append one chunk, the client sends the offset it expects to write at"""
+    if not UPLOAD_ID.match(uploadId):
+        return {"error": "Invalid upload id"}, 400
+    chunk = request.files.get("chunk")
+    offset = request.form.get("offset", type=int)
+    size = request.form.get("size", type=int)
+    if chunk is None or offset is None or size is None:
+        return {"error": "Missing chunk, offset or size"}, 400
+
+    with lockedPart(uploadId) as f:
+        received = f.tell() if f else 0
+        if f is None or offset != received:
+            # Chunk was already stored or one is missing, let the client resume
+            return {"uploadId": uploadId, "offset": received}, 409
+        shutil.copyfileobj(chunk.stream, f, 1024 * 1024)
+        if f.tell() > size:
+            # Chunk runs past the declared size, drop it
+            f.truncate(offset)
+            return {"error": "Chunk exceeds the file size"}, 400
+        f.flush()
+        received = f.tell()
+    if offset == 0:
+        evictUploads(keep=partPath(uploadId))
+    return {"uploadId": uploadId, "offset": received}
+
+
+@upload_blueprint.post("/<uploadId>/complete")
+def completeUpload(uploadId):
+    if not UPLOAD_ID.match(uploadId):
+        return {"error": "Invalid upload id"}, 400
+    size = request.form.get("size", type=int)
+    fileName = request.form.get("fileName", "")
+    path = os.path.join(UPLOAD_DIR, f"{uploadId}.upload")
+
+    if not os.path.exists(path):
+        if size is None:
+            return {"error": "Missing size"}, 400
+        with lockedPart(uploadId) as f:
+            received = f.tell() if f else 0
+            if f is not None and received > size:
+                # More than the declared size was stored, start over
+                f.truncate(0)
+                received = 0
+            if f is None or received != size:
+                return {"uploadId": uploadId, "offset": received}, 409
+            os.replace(partPath(uploadId), path)
+        evictUploads(keep=path)
+
+    return {
+        "uploadId": uploadId,
+        "fileName": fileName,
+        "size": os.path.getsize(path),
+        "complete": True,
+    }
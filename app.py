@@ -3,10 +3,14 @@ from dash import Dash, html, Output, Input, ctx
 from components.Button import Button
 from page.DataDialog import DataDialog
 from utils.CacheManager import background_callback_manager
+from api.upload import upload_blueprint
+from api.cluster import cluster_blueprint
 
 app = Dash(
     __name__, use_pages=True, background_callback_manager=background_callback_manager
 )
+app.server.register_blueprint(upload_blueprint)
+app.server.register_blueprint(cluster_blueprint)
 
 app.layout = html.Div(
     [
@@ -0,0 +1,101 @@
+// Streams files picked in a ChunkedUpload component to /api/upload in chunks.
+// An interrupted upload resumes from the offset the server already has, and
+// once it is complete the upload handle is written to the component's Store.
+(function () {
+  const CHUNK_BYTES = 8 * 1024 * 1024;
+  const RETRIES = 3;
+
+  // Same file gives the same id so a retry picks up where it stopped
+  function uploadId(file) {
+    const text = `${file.name}:${file.size}:${file.lastModified}`;
+    let h1 = 0xdeadbeef;
+    let h2 = 0x41c6ce57;
+    for (let i = 0; i < text.length; i++) {
+      const ch = text.charCodeAt(i);
+      h1 = Math.imul(h1 ^ ch, 2654435761);
+      h2 = Math.imul(h2 ^ ch, 1597334677);
+    }
+    h1 = Math.imul(h1 ^ (h1 >>> 16), 2246822507) ^ Math.imul(h2 ^ (h2 >>> 13), 3266489909);
+    h2 = Math.imul(h2 ^ (h2 >>> 16), 2246822507) ^ Math.imul(h1 ^ (h1 >>> 13), 3266489909);
+    const hex = (value) => (value >>> 0).toString(16).padStart(8, "0");
+    return `${hex(h2)}${hex(h1)}-${file.size.toString(16)}`;
+  }
+
+  function setProps(id, props) {
+    window.dash_clientside.set_props(id, props);
+  }
+
+  async function post(url, body) {
+    for (let attempt = 0; ; attempt++) {
+      try {
+        const response = await fetch(url, { method: "POST", body: body() });
+        const status = await response.json();
+        // 409 means the server expects another offset, resume from there
+        if (!response.ok && response.status !== 409) {
+          throw new Error(status.error || response.statusText);
+        }
+        return status;
+      } catch (error) {
+        if (attempt >= RETRIES) throw error;
+        await new Promise((resolve) => setTimeout(resolve, 1000 * (attempt + 1)));
+      }
+    }
+  }
+
+  async function upload(file, storeId) {
+    const url = `/api/upload/${uploadId(file)}`;
+    const progressId = `${storeId}-progress`;
+    let status = await (await fetch(url)).json();
+
+    while (!status.complete) {
+      const offset = status.offset;
+      setProps(progressId, {
+        value: file.size ? Math.round((100 * offset) / file.size) : 100,
+        style: { display: "block" },
+      });
+      if (offset > file.size) {
+        // Server holds more than this file, retrying would never complete
+        throw new Error(`Server has ${offset} bytes of a ${file.size} byte file`);
+      }
+      if (offset < file.size) {
+        status = await post(url, () => {
+          const body = new FormData();
+          body.append("offset", offset);
+          body.append("size", file.size);
+          body.append("chunk", file.slice(offset, offset + CHUNK_BYTES));
+          return body;
+        });
+      } else {
+        status = await post(`${url}/complete`, () => {
+          const body = new FormData();
+          body.append("fileName", file.name);
+          body.append("size", file.size);
+          return body;
+        });
+      }
+    }
+
+    setProps(progressId, { value: 100, style: { display: "none" } });
+    setProps(storeId, {
+      data: { uploadId: status.uploadId, fileName: file.name, size: status.size },
+    });
+  }
+
+  document.addEventListener("click", (event) => {
+    const wrapper = event.target.closest("[data-chunked-upload]");
+    if (!wrapper) return;
+    const storeId = wrapper.dataset.chunkedUpload;
+    const input = document.createElement("input");
+    input.type = "file";
+    input.accept = wrapper.dataset.accept;
+    input.addEventListener("change", () => {
+      const file = input.files[0];
+      if (!file) return;
+      upload(file, storeId).catch((error) => {
+        console.error("Upload failed", error);
+        setProps(`${storeId}-progress`, { style: { display: "none" } });
+      });
+    });
+    input.click();
+  });
+})();
@@ -0,0 +1,25 @@
+from dash import html, dcc
+
+
+def ChunkedUpload(children: any, id: str, accept=None, className="", **args):
+    """
+    Replacement for dcc.Upload for large files. assets/chunkedUpload.js streams
+    the picked file to /api/upload in chunks and writes
+    {"uploadId", "fileName", "size"} to the `data` of the Store with this id.
+    """
+    return html.Div(
+        children=[
+            html.Div(children=children, className="contents"),
+            html.Progress(
+                id=f"{id}-progress",
+                value=0,
+                max=100,
+                className="w-full h-1",
+                style={"display": "none"},
+            ),
+            dcc.Store(id=id),
+        ],
+        className="cursor-pointer " + className,
+        **{"data-chunked-upload": id, "data-accept": accept or ""},
+        **args,
+    )
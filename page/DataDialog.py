@@ -3,7 +3,8 @@ from components.Typography import P
 from components.Button import Button
 
 import dash_daq as daq
-import pandas as pd
+from utils.DatasetStore import schema_columns
+from utils.FrameCache import load_profile, numeric_frame
 
 
 def DataDialog():
@@ -28,6 +29,29 @@ def DataDialog():
                     size=40,
                     labelPosition="bottom",
                 ),
+                html.Div(
+                    [
+                        daq.ToggleSwitch(
+                            id="approximate",
+                            value=False,
+                            label="Approximate median and mode (columns)",
+                            size=40,
+                            labelPosition="bottom",
+                        ),
+                        dcc.Dropdown(
+                            id="approximate-error",
+                            options=[
+                                {"label": "5% error", "value": 0.05},
+                                {"label": "1% error", "value": 0.01},
+                                {"label": "0.1% error", "value": 0.001},
+                            ],
+                            value=0.01,
+                            clearable=False,
+                            className="w-40",
+                        ),
+                    ],
+                    className="flex gap-4 items-center",
+                ),
                 dcc.Dropdown(id="label", className="my-2"),
                 dcc.Checklist(id="checklist"),
                 html.P(id="checked"),
@@ -56,14 +80,7 @@ def closeDialog(n_clicks):
     prevent_initial_call=True,
 )
 def getColNames(file):
-    if file and file["content"]:
-        df = pd.DataFrame(file["content"])
-        cols = []
-        for col in df.columns:
-            cols.append(col)
-        return cols
-    else:
-        return []
+    return schema_columns(file)
 
 
 @callback(
@@ -78,17 +95,28 @@ def getColNames(file):
 )
 def process_form(file, useRow):
     checklists = []
-    if file and file["content"]:
-        df = pd.DataFrame(file["content"])
+    profile = load_profile(file.get("datasetId")) if file else None
+    if profile is not None:
+        if useRow is True and profile.get("streamed"):
+            # Too many rows to list, the analysis shows the column summary only
+            return (
+                [],
+                [],
+                {"display": "block"},
+                schema_columns(file)[0],
+                "Using Rows (too many to list)",
+            )
         if useRow is True:
-            checklists = df.select_dtypes(include="number").dropna().axes[0].tolist()
+            # Labels of the complete rows, the numeric frame is cached
+            checklists = numeric_frame(file["datasetId"]).index.tolist()
         else:
-            checklists = df.select_dtypes(include="number").dropna().columns.tolist()
+            # Precomputed at upload, no need to scan the frame on every toggle
+            checklists = profile["numericColumns"]
         return (
             checklists,
             checklists,
             {"display": "block"} if useRow else {"display": "none"},
-            df.columns[0],
+            schema_columns(file)[0],
             "Using Rows" if useRow else "Using Columns",
         )
     else:
@@ -100,8 +128,10 @@ def process_form(file, useRow):
     Input("checklist", "value"),
     Input("use-row", "value"),
     Input("label", "value"),
+    Input("approximate", "value"),
+    Input("approximate-error", "value"),
 )
-def updateColRow(checkedValues, useRow, label):
+def updateColRow(checkedValues, useRow, label, approximate, error):
     if useRow:
         return {"useRow": True, "values": checkedValues, "label": label}
     else:
@@ -109,4 +139,6 @@ def updateColRow(checkedValues, useRow, label):
             "useRow": False,
             "values": checkedValues,
             "label": label,
+            "approximate": approximate,
+            "error": error,
         }
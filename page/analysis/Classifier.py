@@ -1,11 +1,20 @@
-from dash import dcc, html, callback, Output, Input
-import pandas as pd
+from dash import dcc, html, callback, Output, Input, State
 from page.analysis.ClassifierDialog import ClassifierDialog
-from sklearn.ensemble import AdaBoostClassifier, RandomForestClassifier
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import classification_report, accuracy_score
 from components.Typography import P
 from components.Button import Button
+from utils.DatasetStore import schema_columns
+from utils.ClassifierPipeline import (
+    ALGORITHM_LABELS,
+    STREAM_ALGORITHMS,
+    STREAM_LABELS,
+    compare_classifiers,
+    cross_validate,
+    hyperparameter_search,
+    stream_train,
+    train_classifier,
+)
+from utils.FrameCache import is_streamed
+from utils.ModelCache import get_trained
 
 
 def Classifier():
@@ -43,6 +52,93 @@ def Classifier():
             html.Div(
                 id="accuracy-display", className="mt-4 text-lg font-bold"
             ),  # Placeholder for accuracy
+            html.Div(id="classifier-comparison", className="mt-4"),
+            # Successive halving search, run in a background worker
+            html.Div(
+                [
+                    P("Hyperparameter Search", variant="body2", className="mb-2"),
+                    html.Div(
+                        [
+                            Button(
+                                children="Tune hyperparameters",
+                                variant="primary_ghost",
+                                size="sm",
+                                id="search-start",
+                                n_clicks=0,
+                                className="w-fit",
+                            ),
+                            Button(
+                                children="Cancel",
+                                variant="secondary_ghost",
+                                size="sm",
+                                id="search-cancel",
+                                n_clicks=0,
+                                disabled=True,
+                                className="w-fit",
+                            ),
+                        ],
+                        className="flex gap-2",
+                    ),
+                    html.Progress(
+                        id="search-progress",
+                        value=0,
+                        max=100,
+                        className="w-full h-1 mt-2",
+                        style={"display": "none"},
+                    ),
+                    html.Div(id="search-result", className="mt-2"),
+                ],
+                className="p-4 bg-[#eeffff] rounded-lg mt-4",
+            ),
+            # partial_fit learner over the stored chunks, for datasets that don't
+            # fit in memory, run in a background worker
+            html.Div(
+                [
+                    P("Out-of-Core Training", variant="body2", className="mb-2"),
+                    dcc.Dropdown(
+                        id="stream-algorithm",
+                        options=[
+                            {"label": STREAM_LABELS[a], "value": a}
+                            for a in STREAM_ALGORITHMS
+                        ],
+                        value=STREAM_ALGORITHMS[0],
+                        clearable=False,
+                        className="mb-2",
+                    ),
+                    html.Div(
+                        [
+                            Button(
+                                children="Train chunk by chunk",
+                                variant="primary_ghost",
+                                size="sm",
+                                id="stream-start",
+                                n_clicks=0,
+                                className="w-fit",
+                            ),
+                            Button(
+                                children="Cancel",
+                                variant="secondary_ghost",
+                                size="sm",
+                                id="stream-cancel",
+                                n_clicks=0,
+                                disabled=True,
+                                className="w-fit",
+                            ),
+                        ],
+                        className="flex gap-2",
+                    ),
+                    html.Progress(
+                        id="stream-progress",
+                        value=0,
+                        max=100,
+                        className="w-full h-1 mt-2",
+                        style={"display": "none"},
+                    ),
+                    html.Div(id="stream-accuracy", className="mt-2"),
+                    html.Div(id="stream-result", className="mt-2"),
+                ],
+                className="p-4 bg-[#eeffff] rounded-lg mt-4",
+            ),
             Button(
                 children=[
                     "Setting",
@@ -64,6 +160,7 @@ def Classifier():
         Output("classification-report-body", "children"),
         Output("accuracy-display", "children"),  # Output for accuracy
         Output("classifier-title", "children"),  # Output for classifier title
+        Output("classifier-comparison", "children"),
     ],
     [
         Input("file-store", "data"),
@@ -72,10 +169,11 @@ def Classifier():
         Input("test-size-slider", "value"),
         Input("train-size-slider", "value"),
         Input("classifier-dropdown", "value"),  # Input for the selected classifier
+        Input("cv-folds-dropdown", "value"),
     ],
 )
-def classifier(file, xColumns, yColumns, test_size, train_size, classifier_type):
-    if not file or "content" not in file:
+def classifier(file, xColumns, yColumns, test_size, train_size, classifier_type, folds):
+    if not file or not file.get("datasetId"):
         return (
             [
                 html.Tr(
@@ -88,14 +186,11 @@ def classifier(file, xColumns, yColumns, test_size, train_size, classifier_type)
                     ]
                 )
             ],
-            f"Train Size: {train_size:.2f}",
-            f"Test Size: {test_size:.2f}",
             "Accuracy: N/A",
             f"Report Using {classifier_type.capitalize()} Classifier",  # Classifier title
+            None,
         )
 
-    df = pd.DataFrame(file["content"])
-
     if not xColumns or not yColumns:
         return (
             [
@@ -109,54 +204,97 @@ def classifier(file, xColumns, yColumns, test_size, train_size, classifier_type)
                     ]
                 )
             ],
-            f"Train Size: {train_size:.2f}",
-            f"Test Size: {test_size:.2f}",
             "Accuracy: N/A",
             f"Report Using {classifier_type.capitalize()} Classifier",  # Classifier title
+            None,
         )
 
-    x = df[xColumns].select_dtypes(include="number")
-    y = df[yColumns]
-    if y.dtype == float:
-        y = df[yColumns].astype(int)
-    if test_size + train_size > 1:
-        train_size = 1 - test_size
-
-    try:
-        x_train, x_test, y_train, y_test = train_test_split(
-            x, y, test_size=test_size, train_size=train_size, random_state=42
-        )
-    except ValueError as e:
+    if is_streamed(file["datasetId"]):
         return (
             [
                 html.Tr(
                     [
                         html.Td(
-                            f"Error in train-test split: {e}",
+                            "Dataset is too large to load, use Out-of-Core Training.",
                             colSpan=5,
                             className="p-2 border",
                         )
                     ]
                 )
             ],
-            f"Train Size: {train_size:.2f}",
-            f"Test Size: {test_size:.2f}",
             "Accuracy: N/A",
             f"Report Using {classifier_type.capitalize()} Classifier",  # Classifier title
+            None,
+        )
+
+    # Same data and settings give the same model, reuse the stored result
+    config = classifierConfig(
+        xColumns, yColumns, test_size, train_size, classifier_type
+    )
+    # Comparison mode always uses the train/test split
+    if folds and classifier_type != "compare":
+        return crossValidation(file["datasetId"], config, folds)
+
+    try:
+        if classifier_type == "compare":
+            results = compare_classifiers(file["datasetId"], config)
+            result = results and max(results.values(), key=lambda r: r["accuracy"])
+        else:
+            result = get_trained(file["datasetId"], config)
+            if result is None:
+                result = train_classifier(file["datasetId"], config)
+        message = "Dataset is no longer available, please upload it again."
+    except ValueError as e:
+        result, message = None, f"Error in train-test split: {e}"
+    if result is None:
+        return (
+            [html.Tr([html.Td(message, colSpan=5, className="p-2 border")])],
+            "Accuracy: N/A",
+            f"Report Using {classifier_type.capitalize()} Classifier",  # Classifier title
+            None,
         )
+    report, accuracy = result["report"], result["accuracy"]
+
+    rows = reportRows(report)
 
-    # Select model based on the classifier type
-    if classifier_type == "adaboost":
-        model = AdaBoostClassifier(random_state=42)
-    elif classifier_type == "randomforest":
-        model = RandomForestClassifier(random_state=42)
+    if classifier_type == "compare":
+        best = next(a for a, r in results.items() if r is result)
+        return (
+            rows,
+            f"Accuracy: {accuracy:.2f}",
+            f"Report Using {ALGORITHM_LABELS[best]} Classifier, the most accurate",
+            comparisonTable(results, best),
+        )
 
-    model.fit(x_train, y_train)
-    y_pred = model.predict(x_test)
+    if result.get("iterations"):
+        accuracy = f"{accuracy:.2f}, stopped after {result['iterations']} iterations"
+    else:
+        accuracy = f"{accuracy:.2f}"
+    return (
+        rows,
+        f"Accuracy: {accuracy}",  # Display accuracy under the table
+        f"Report Using {ALGORITHM_LABELS[classifier_type]} Classifier",  # Classifier title
+        None,
+    )
 
-    report = classification_report(y_test, y_pred, output_dict=True)
-    accuracy = accuracy_score(y_test, y_pred)
 
+def classifierConfig(xColumns, yColumns, test_size, train_size, classifier_type):
+    """Settings that identify a trained model in the model cache"""
+    if isinstance(xColumns, str):
+        xColumns = [xColumns]
+    if test_size + train_size > 1:
+        train_size = 1 - test_size
+    return {
+        "features": xColumns,
+        "target": yColumns,
+        "testSize": test_size,
+        "trainSize": train_size,
+        "algorithm": classifier_type,
+    }
+
+
+def reportRows(report):
+    """Table rows of a classification report, one per class and average"""
     rows = []
     for idx, (label, metrics) in enumerate(report.items()):
         if label == "accuracy":
@@ -172,14 +310,279 @@ def classifier(file, xColumns, yColumns, test_size, train_size, classifier_type)
                 ]
             )
         )
+    return rows
+
 
+def comparisonTable(results, best):
+    """Accuracy, fit time and prediction latency of every trained classifier"""
+    return timingTable(
+        "Classifier",
+        [(ALGORITHM_LABELS[a], result) for a, result in results.items()],
+        ALGORITHM_LABELS[best],
+    )
+
+
+def timingTable(first, entries, best=None):
+    """Accuracy, fit time and prediction latency of each (label, result) pair"""
+    header = [first, "Accuracy", "Fit Time", "Predict Latency"]
+    rows = []
+    for label, result in entries:
+        fit = result.get("fitSeconds")
+        predict = result.get("predictSeconds")
+        rows.append(
+            html.Tr(
+                [
+                    html.Td(label, className="p-2 border"),
+                    html.Td(f"{result['accuracy']:.3f}", className="p-2 border"),
+                    html.Td(
+                        "N/A" if fit is None else f"{fit:.2f} s",
+                        className="p-2 border",
+                    ),
+                    html.Td(
+                        (
+                            "N/A"
+                            if predict is None
+                            else f"{predict * 1e6 / max(1, result['testRows']):.1f} µs/row"
+                        ),
+                        className="p-2 border",
+                    ),
+                ],
+                className="font-semibold" if label == best else None,
+            )
+        )
+    return html.Table(
+        [
+            html.Thead(html.Tr([html.Th(name, className="p-2") for name in header])),
+            html.Tbody(rows),
+        ],
+        className="w-full border-collapse",
+    )
+
+
+def crossValidation(datasetId, config, folds):
+    """Callback outputs for k-fold mode: per fold scores, mean and std"""
+    title = f"{folds}-Fold Cross-Validation of {ALGORITHM_LABELS[config['algorithm']]} Classifier"
+    try:
+        result = cross_validate(datasetId, config, folds)
+        message = "Dataset is no longer available, please upload it again."
+    except ValueError as e:
+        result, message = None, f"Error in cross-validation: {e}"
+    if result is None:
+        return (
+            [html.Tr([html.Td(message, colSpan=5, className="p-2 border")])],
+            "Accuracy: N/A",
+            title,
+            None,
+        )
+
+    def scoreRow(label, metrics, support):
+        return html.Tr(
+            [
+                html.Td(label, className="p-2 border"),
+                html.Td(f"{metrics['precision']:.2f}", className="p-2 border"),
+                html.Td(f"{metrics['recall']:.2f}", className="p-2 border"),
+                html.Td(f"{metrics['f1-score']:.2f}", className="p-2 border"),
+                html.Td(support, className="p-2 border"),
+            ]
+        )
+
+    scores = result["folds"]
+    rows = [
+        scoreRow(f"Fold {i} (macro avg)", fold, f"{fold['testRows']:.0f}")
+        for i, fold in enumerate(scores, start=1)
+    ]
+    total = sum(fold["testRows"] for fold in scores)
+    rows.append(scoreRow("Mean", result["mean"], f"{total:.0f}"))
+    rows.append(scoreRow("Std", result["std"], ""))
+    mean, std = result["mean"]["accuracy"], result["std"]["accuracy"]
     return (
         rows,
-        f"Accuracy: {accuracy:.2f}",  # Display accuracy under the table
-        f"Report Using {classifier_type.capitalize()} Classifier",  # Classifier title
+        f"Accuracy: {mean:.3f} ± {std:.3f} over {folds} folds",
+        title,
+        html.Div(
+            [
+                timingTable(
+                    "Fold", [(f"Fold {i}", f) for i, f in enumerate(scores, start=1)]
+                ),
+                html.P(
+                    f"All folds took {result['wallSeconds']:.2f} s wall clock",
+                    className="mt-2",
+                ),
+            ]
+        ),
     )
 
 
+@callback(
+    Output("search-result", "children"),
+    Input("search-start", "n_clicks"),
+    State("file-store", "data"),
+    State("x-columns", "value"),
+    State("y-columns", "value"),
+    State("test-size-slider", "value"),
+    State("train-size-slider", "value"),
+    State("classifier-dropdown", "value"),
+    background=True,
+    running=[
+        (Output("search-start", "disabled"), True, False),
+        (Output("search-cancel", "disabled"), False, True),
+        (
+            Output("search-progress", "style"),
+            {"display": "block"},
+            {"display": "none"},
+        ),
+    ],
+    cancel=[Input("search-cancel", "n_clicks")],
+    progress=[
+        Output("search-progress", "value"),
+        Output("search-progress", "max"),
+    ],
+    prevent_initial_call=True,
+)
+def tune_classifier(
+    set_progress,
+    n_clicks,
+    file,
+    xColumns,
+    yColumns,
+    test_size,
+    train_size,
+    classifier_type,
+):
+    """
+    Search the hyperparameters of the selected classifier in a background
+    worker, the best setting is stored per dataset and shown with its scores.
+    """
+    if not file or not file.get("datasetId") or not xColumns or not yColumns:
+        return "Please select both features and target columns."
+    if classifier_type == "compare":
+        return "Pick a single classifier to tune."
+    if is_streamed(file["datasetId"]):
+        return "Dataset is too large to load, use Out-of-Core Training."
+    config = classifierConfig(
+        xColumns, yColumns, test_size, train_size, classifier_type
+    )
+    try:
+        result = hyperparameter_search(
+            file["datasetId"],
+            config,
+            progress=lambda done, total: set_progress((done, total)),
+        )
+    except ValueError as e:
+        return f"Error in hyperparameter search: {e}"
+    if result is None:
+        return "Dataset is no longer available, please upload it again."
+
+    params = ", ".join(
+        f"{name}={value:.3g}" if isinstance(value, float) else f"{name}={value}"
+        for name, value in sorted(result["params"].items())
+    )
+    rounds = [
+        html.Tr(
+            [
+                html.Td(str(i), className="p-2 border"),
+                html.Td(str(step["candidates"]), className="p-2 border"),
+                html.Td(str(step["rows"]), className="p-2 border"),
+                html.Td(f"{step['bestAccuracy']:.3f}", className="p-2 border"),
+            ]
+        )
+        for i, step in enumerate(result["rounds"], start=1)
+    ]
+    header = ["Round", "Candidates", "Training Rows", "Best Accuracy"]
+    return [
+        P(
+            f"Best {ALGORITHM_LABELS[classifier_type]} setting after "
+            f"{result['fits']} fits: {params}",
+            variant="body2",
+        ),
+        P(
+            f"Validation accuracy: {result['validationAccuracy']:.3f}, "
+            f"test accuracy: {result['accuracy']:.3f}",
+            variant="body2",
+            className="my-2",
+        ),
+        html.Table(
+            [
+                html.Thead(
+                    html.Tr([html.Th(name, className="p-2") for name in header])
+                ),
+                html.Tbody(rounds),
+            ],
+            className="w-full border-collapse",
+        ),
+    ]
+
+
+@callback(
+    Output("stream-result", "children"),
+    Input("stream-start", "n_clicks"),
+    State("file-store", "data"),
+    State("x-columns", "value"),
+    State("y-columns", "value"),
+    State("test-size-slider", "value"),
+    State("train-size-slider", "value"),
+    State("stream-algorithm", "value"),
+    background=True,
+    running=[
+        (Output("stream-start", "disabled"), True, False),
+        (Output("stream-cancel", "disabled"), False, True),
+        (
+            Output("stream-progress", "style"),
+            {"display": "block"},
+            {"display": "none"},
+        ),
+    ],
+    cancel=[Input("stream-cancel", "n_clicks")],
+    progress=[
+        Output("stream-progress", "value"),
+        Output("stream-progress", "max"),
+        Output("stream-accuracy", "children"),
+    ],
+    prevent_initial_call=True,
+)
+def train_out_of_core(
+    set_progress, n_clicks, file, xColumns, yColumns, test_size, train_size, algorithm
+):
+    """
+    Train the streaming learner over the stored chunks in a background worker,
+    showing the accuracy on the test rows seen so far after every chunk.
+    """
+    if not file or not file.get("datasetId") or not xColumns or not yColumns:
+        return "Please select both features and target columns."
+    config = classifierConfig(xColumns, yColumns, test_size, train_size, algorithm)
+
+    def progress(done, total, accuracy):
+        live = "N/A" if accuracy is None else f"{accuracy:.3f}"
+        set_progress((done, total, f"Accuracy so far: {live}"))
+
+    try:
+        result = stream_train(file["datasetId"], config, algorithm, progress)
+    except ValueError as e:
+        return f"Error in out-of-core training: {e}"
+    if result is None:
+        return "Dataset is no longer available, please upload it again."
+
+    header = ["Values", "Precision", "Recall", "F1-Score", "Support"]
+    return [
+        P(
+            f"{STREAM_LABELS[algorithm]} trained on {result['trainRows']} rows "
+            f"in {len(result['history'])} chunks, test accuracy "
+            f"{result['accuracy']:.3f} on {result['testRows']} rows",
+            variant="body2",
+            className="mb-2",
+        ),
+        html.Table(
+            [
+                html.Thead(
+                    html.Tr([html.Th(name, className="p-2") for name in header])
+                ),
+                html.Tbody(reportRows(result["report"])),
+            ],
+            className="w-full border-collapse",
+        ),
+    ]
+
+
 @callback(
     [
         Output("x-columns", "options"),
@@ -190,17 +593,12 @@ def classifier(file, xColumns, yColumns, test_size, train_size, classifier_type)
     Input("file-store", "data"),
 )
 def initialize_dropdowns(file):
-    if file is None:
+    # Get column options from the stored schema, no need to load the frame
+    all_columns = schema_columns(file)
+    numeric_columns = schema_columns(file, numeric=True)
+    if not all_columns:
         return [], [], [], None
 
-    df = pd.DataFrame(file["content"])
-    if df.empty:
-        return [], [], [], None
-
-    # Get column options
-    all_columns = df.columns
-    numeric_columns = df.select_dtypes(include="number").columns
-
     # x-columns options and defaults
     x_options = [{"label": col, "value": col} for col in all_columns]
     x_default = list(numeric_columns)
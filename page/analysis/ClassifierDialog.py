@@ -1,5 +1,6 @@
 from dash import html, dcc, callback, Input, Output
 from components.Typography import P
+from utils.ClassifierPipeline import CV_FOLDS
 
 
 def ClassifierDialog():
@@ -12,6 +13,11 @@ def ClassifierDialog():
                     options=[
                         {"label": "AdaBoost Classifier", "value": "adaboost"},
                         {"label": "Random Forest Classifier", "value": "randomforest"},
+                        {
+                            "label": "Histogram Gradient Boosting Classifier",
+                            "value": "histgradient",
+                        },
+                        {"label": "Compare All Classifiers", "value": "compare"},
                     ],
                     value="adaboost",  # Default value is AdaBoost
                     clearable=False,
@@ -53,6 +59,18 @@ def ClassifierDialog():
                         for i in [0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9]
                     },
                 ),
+                html.Label("Select Evaluation:"),
+                dcc.Dropdown(
+                    id="cv-folds-dropdown",
+                    options=[{"label": "Train/Test Split", "value": 0}]
+                    + [
+                        {"label": f"{k}-Fold Cross-Validation", "value": k}
+                        for k in CV_FOLDS
+                    ],
+                    value=0,
+                    clearable=False,
+                    style={"width": "100%"},
+                ),
                 html.Button(
                     id="classifier-close-btn",
                     children=[
@@ -1,20 +1,30 @@
-import pandas as pd
 import numpy as np
 import plotly.graph_objs as go
 
-from page.analysis.ClusteringDialog import ClusteringDialog
+from page.analysis.ClusteringDialog import EMBEDDING_LABELS, ClusteringDialog
 from components.Button import Button
-from dash import html, dcc, Input, Output, callback
-from sklearn.preprocessing import StandardScaler, MinMaxScaler
-from sklearn.cluster import KMeans
-from sklearn.decomposition import PCA
+from dash import html, dcc, ctx, Input, Output, State, callback
 from components.Typography import P
+from utils.ClusterPipeline import (
+    cluster_profile_table,
+    clustering_labels,
+    compute_embedding,
+    inertia_gap,
+    k_sweep,
+    load_embedding,
+    projection,
+    save_model,
+    stream_minibatch_kmeans,
+)
+from utils.Downsample import SCATTER_BUDGET, stratified_indices
+from utils.FrameCache import is_streamed, numeric_frame
 
 
 def Clustering():
     return html.Div(
         [
             dcc.Store(id="file-store", storage_type="local"),
+            dcc.Store(id="embedding-ready"),
             ClusteringDialog(),
             P(
                 "K-Means Clustering",
@@ -68,6 +78,14 @@ def Clustering():
                         ],
                         className="w-full grid grid-cols-2",
                     ),
+                    html.Div(id="cluster-hover", className="min-h-6 px-4"),
+                    dcc.Graph(
+                        id="embedding-data",
+                        config={
+                            "displayModeBar": False,
+                            "displaylogo": False,
+                        },
+                    ),
                 ],
             ),
             Button(
@@ -91,18 +109,62 @@ def Clustering():
         Output("unlabeled-data", "figure"),
         Output("clustered-data", "figure"),
         Output("cluster-summary", "children"),
+        Output("cluster-profile", "data"),
+        Output("embedding-data", "figure"),
     ],
     [
         Input("n-clusters-slider", "value"),
         Input("scaling-method-dropdown", "value"),
         Input("file-store", "data"),
+        Input("clustering-mode-dropdown", "value"),
+        Input("eps-slider", "value"),
+        Input("min-samples-slider", "value"),
+        Input("embedding-method-dropdown", "value"),
+        Input("embedding-perplexity-slider", "value"),
+        Input("embedding-ready", "data"),
     ],
 )
-def update_clustering_visualization(n_clusters, scaling_method, file_data):
+def update_clustering_visualization(
+    n_clusters,
+    scaling_method,
+    file_data,
+    mode,
+    eps,
+    min_samples,
+    embedding_method,
+    perplexity,
+    embedding_ready,
+):
     """
     Callback to update clustering visualizations based on user inputs
     """
-    if not file_data:
+    key = file_data.get("datasetId") if file_data else None
+    streamed = is_streamed(key)
+    if streamed and mode != "minibatch":
+        # The other modes need the whole matrix in memory
+        layout = go.Layout(
+            title="Dataset too large to cluster in memory",
+            plot_bgcolor="rgba(0,0,0,0)",
+            paper_bgcolor="rgba(0,0,0,0)",
+        )
+        return (
+            go.Figure(layout=layout),
+            go.Figure(layout=layout),
+            P(
+                "This file was stored in chunks, only Mini-batch clustering "
+                "reads it chunk by chunk",
+                variant="body2",
+            ),
+            None,
+            go.Figure(layout=layout),
+        )
+    if streamed:
+        # Trained over the stored chunks, plotted and profiled on a sample
+        clustered = stream_minibatch_kmeans(key, scaling_method, n_clusters)
+        X = clustered["sample"] if clustered is not None else None
+    else:
+        X = numeric_frame(key)
+    if X is None:
         # Return default figures if no data uploaded
         default_layout = go.Layout(
             title="Please Upload Data",
@@ -113,101 +175,161 @@ def update_clustering_visualization(n_clusters, scaling_method, file_data):
             go.Figure(layout=default_layout),
             go.Figure(layout=default_layout),
             P("No data uploaded", variant="body2"),
+            None,
+            go.Figure(layout=default_layout),
         )
 
     try:
-        df = pd.DataFrame(file_data["content"])
+        # Scaling and the PCA projection are cached, only KMeans depends on k
+        pca = clustered if streamed else projection(key, scaling_method)
+        X_pca = pca["coordinates"]
+        first, second = pca["explainedVariance"]
 
-        # Select numerical columns
-        numerical_cols = df.select_dtypes(include=[np.number]).columns
-        X = df[numerical_cols]
-
-        # Standardize/Scale data
-        if scaling_method == "standard":
-            scaler = StandardScaler()
+        # Clustering
+        if mode == "dbscan":
+            parameters = (eps, min_samples)
+            title = f"DBSCAN (eps={eps}, min_samples={min_samples})"
+        elif mode == "hdbscan":
+            parameters = (min_samples,)
+            title = f"HDBSCAN (min_samples={min_samples})"
         else:
-            scaler = MinMaxScaler()
-        X_scaled = scaler.fit_transform(X)
-
-        # Dimensionality reduction for visualization
-        pca = PCA(n_components=2)
-        X_pca = pca.fit_transform(X_scaled)
+            parameters = (n_clusters,)
+            title = f"K-Means Clustering (k={n_clusters})"
+        if streamed:
+            cluster_labels = clustered["labels"]
+            centers = clustered["model"].cluster_centers_
+        else:
+            cluster_labels, centers = clustering_labels(
+                file_data["datasetId"], scaling_method, mode, parameters
+            )
+        if centers is not None:
+            # Kept for /api/cluster/<dataset>/assign
+            save_model(file_data["datasetId"], scaling_method, centers, X.columns)
 
-        # Unlabeled data scatter plot
+        # WebGL scatter of a per-cluster sample, row details load on hover
+        keep = stratified_indices(cluster_labels, SCATTER_BUDGET)
+        rows = X.index.to_numpy()[keep]
         unlabeled_fig = go.Figure(
-            data=go.Scatter(
-                x=X_pca[:, 0],
-                y=X_pca[:, 1],
+            data=go.Scattergl(
+                x=X_pca[keep, 0],
+                y=X_pca[keep, 1],
                 mode="markers",
                 marker=dict(color="blue", size=8),
-                text=df.index,
-                hoverinfo="text",
+                customdata=rows,
+                hovertemplate="Row %{customdata}<extra></extra>",
             ),
             layout=go.Layout(
-                title="Original Data (PCA Reduced)",
-                xaxis_title="First Principal Component",
-                yaxis_title="Second Principal Component",
+                title=f"Original Data (PCA Reduced, {first + second:.0%} of variance)",
+                xaxis_title=f"First Principal Component ({first:.1%})",
+                yaxis_title=f"Second Principal Component ({second:.1%})",
                 plot_bgcolor="rgba(0,0,0,0)",
                 paper_bgcolor="rgba(0,0,0,0)",
             ),
         )
-
-        # Clustering
-        kmeans = KMeans(n_clusters=n_clusters, random_state=42)
-        cluster_labels = kmeans.fit_predict(X_scaled)
-
-        # Clustered data scatter plot
         clustered_fig = go.Figure(
-            data=go.Scatter(
-                x=X_pca[:, 0],
-                y=X_pca[:, 1],
+            data=go.Scattergl(
+                x=X_pca[keep, 0],
+                y=X_pca[keep, 1],
                 mode="markers",
-                marker=dict(color=cluster_labels, colorscale="Viridis", size=8),
-                text=[f"Cluster: {label}" for label in cluster_labels],
-                hoverinfo="text",
+                marker=dict(color=cluster_labels[keep], colorscale="Viridis", size=8),
+                customdata=np.column_stack([rows, cluster_labels[keep]]),
+                hovertemplate="Row %{customdata[0]}, Cluster: %{customdata[1]}<extra></extra>",
             ),
             layout=go.Layout(
-                title=f"K-Means Clustering (k={n_clusters})",
-                xaxis_title="First Principal Component",
-                yaxis_title="Second Principal Component",
+                title=title,
+                xaxis_title=f"First Principal Component ({first:.1%})",
+                yaxis_title=f"Second Principal Component ({second:.1%})",
                 plot_bgcolor="rgba(0,0,0,0)",
                 paper_bgcolor="rgba(0,0,0,0)",
             ),
         )
 
-        # Cluster Summary
-        cluster_summary_df = pd.DataFrame(
-            {
-                "Cluster": range(n_clusters),
-                "Size": [sum(cluster_labels == i) for i in range(n_clusters)],
-            }
+        # Cluster Summary, the profile table pages through the cached rows
+        cluster_profile_table(
+            file_data["datasetId"], scaling_method, mode, parameters, cluster_labels
+        )
+        profile_key = (
+            file_data["datasetId"],
+            "cluster-profile",
+            scaling_method,
+            mode,
+            *parameters,
         )
 
         cluster_summary_children = [
             P("Cluster Summary", variant="body1", className="mb-2"),
-            html.Table(
-                children=[
-                    html.Thead(
-                        children=html.Tr(
-                            [html.Th(col) for col in cluster_summary_df.columns]
-                        )
-                    ),
-                    html.Tbody(
-                        children=[
-                            html.Tr(
-                                [
-                                    html.Td(cluster_summary_df.iloc[i][col])
-                                    for col in cluster_summary_df.columns
-                                ]
-                            )
-                            for i in range(len(cluster_summary_df))
-                        ]
-                    ),
-                ]
-            ),
         ]
+        if mode == "minibatch":
+            gap = inertia_gap(file_data["datasetId"], scaling_method, n_clusters)
+            change = gap["minibatchInertia"] / gap["fullInertia"] - 1
+            cluster_summary_children.append(
+                P(
+                    f"Mini-batch inertia on a {gap['sampleRows']:,} row sample: "
+                    f"{gap['minibatchInertia']:.1f} vs {gap['fullInertia']:.1f} "
+                    f"for full K-Means ({change:+.1%})",
+                    variant="body2",
+                    className="mt-2",
+                )
+            )
 
-        return unlabeled_fig, clustered_fig, cluster_summary_children
+        if streamed:
+            cluster_summary_children.append(
+                P(
+                    f"Clustered {clustered['rows']:,} rows chunk by chunk, plotting "
+                    f"and profiling a {len(X):,} row sample",
+                    variant="body2",
+                    className="mt-2",
+                )
+            )
+        elif len(keep) < len(X):
+            cluster_summary_children.append(
+                P(
+                    f"Plotting {len(keep):,} of {len(X):,} rows, sampled per cluster",
+                    variant="body2",
+                    className="mt-2",
+                )
+            )
+
+        # Cached nonlinear embedding of a sample, recoloured with these labels
+        embedding = load_embedding(
+            file_data["datasetId"], scaling_method, embedding_method, perplexity
+        )
+        embedding_layout = go.Layout(
+            title=(
+                f"{EMBEDDING_LABELS[embedding_method]} Embedding"
+                if embedding is not None
+                else "Compute an embedding in the settings"
+            ),
+            plot_bgcolor="rgba(0,0,0,0)",
+            paper_bgcolor="rgba(0,0,0,0)",
+        )
+        if embedding is None:
+            embedding_fig = go.Figure(layout=embedding_layout)
+        else:
+            embedded_rows, coordinates = embedding
+            embedding_fig = go.Figure(
+                data=go.Scattergl(
+                    x=coordinates[:, 0],
+                    y=coordinates[:, 1],
+                    mode="markers",
+                    marker=dict(
+                        color=cluster_labels[embedded_rows],
+                        colorscale="Viridis",
+                        size=6,
+                    ),
+                    customdata=X.index.to_numpy()[embedded_rows],
+                    hovertemplate="Row %{customdata}<extra></extra>",
+                ),
+                layout=embedding_layout,
+            )
+
+        return (
+            unlabeled_fig,
+            clustered_fig,
+            cluster_summary_children,
+            list(profile_key),
+            embedding_fig,
+        )
 
     except Exception as e:
         # Error handling
@@ -224,8 +346,152 @@ def update_clustering_visualization(n_clusters, scaling_method, file_data):
                 variant="body2",
                 className="text-red-500",
             ),
+            None,
+            go.Figure(layout=error_layout),
         )
 
+
+@callback(
+    Output("cluster-profile-table", "data"),
+    Output("cluster-profile-table", "columns"),
+    Output("cluster-profile-table", "page_count"),
+    Output("cluster-profile-table", "page_current"),
+    Input("cluster-profile", "data"),
+    Input("cluster-profile-table", "page_current"),
+    Input("cluster-profile-table", "page_size"),
+)
+def page_cluster_profile(profile_key, page_current, page_size):
+    """One page of the cluster profile, the full table stays on the server"""
+    profile = None
+    if profile_key:
+        key, _, scaling_method, mode, *parameters = profile_key
+        profile = cluster_profile_table(key, scaling_method, mode, tuple(parameters))
+    if not profile:
+        return [], [], 0, 0
+    if ctx.triggered_id != "cluster-profile-table":
+        page_current = 0  # a new clustering starts on the first page
+    start = (page_current or 0) * page_size
+    columns = [{"name": name, "id": name} for name in profile[0]]
+    return (
+        profile[start : start + page_size],
+        columns,
+        -(-len(profile) // page_size),
+        page_current or 0,
+    )
+
+
+@callback(
+    Output("cluster-hover", "children"),
+    Input("unlabeled-data", "hoverData"),
+    Input("clustered-data", "hoverData"),
+    State("file-store", "data"),
+    prevent_initial_call=True,
+)
+def show_hovered_row(unlabeled_hover, clustered_hover, file_data):
+    """Values of the hovered row, looked up on the server instead of sent per point"""
+    hover = clustered_hover if ctx.triggered_id == "clustered-data" else unlabeled_hover
+    key = file_data.get("datasetId") if file_data else None
+    X = numeric_frame(key) if not is_streamed(key) else None
+    if not hover or X is None:
+        return None
+    row = hover["points"][0].get("customdata")
+    if isinstance(row, list):
+        row = row[0]
+    if row not in X.index:
+        return None
+    values = ", ".join(f"{col}: {value:.4g}" for col, value in X.loc[row].items())
+    return P(f"Row {row} - {values}", variant="body2")
+
+
+@callback(
+    Output("embedding-ready", "data"),
+    Input("embedding-compute", "n_clicks"),
+    State("file-store", "data"),
+    State("scaling-method-dropdown", "value"),
+    State("embedding-method-dropdown", "value"),
+    State("embedding-perplexity-slider", "value"),
+    background=True,
+    running=[
+        (Output("embedding-compute", "disabled"), True, False),
+        (
+            Output("embedding-progress", "style"),
+            {"display": "block"},
+            {"display": "none"},
+        ),
+    ],
+    progress=[
+        Output("embedding-progress", "value"),
+        Output("embedding-progress", "max"),
+    ],
+    prevent_initial_call=True,
+)
+def compute_embedding_view(
+    set_progress, n_clicks, file_data, scaling_method, method, perplexity
+):
+    """Fit the embedding in a background worker, the page then reads it from disk"""
+    key = file_data.get("datasetId") if file_data else None
+    if not key or is_streamed(key):
+        return None
+    path = compute_embedding(
+        key,
+        scaling_method,
+        method,
+        perplexity,
+        progress=lambda done, total: set_progress((done, total)),
+    )
+    return {"datasetId": key, "ready": path is not None}
+
+
+@callback(
+    Output("k-sweep-graph", "figure"),
+    Input("file-store", "data"),
+    Input("scaling-method-dropdown", "value"),
+    background=True,
+    running=[
+        (
+            Output("k-sweep-progress", "style"),
+            {"display": "block"},
+            {"display": "none"},
+        ),
+    ],
+    progress=[
+        Output("k-sweep-progress", "value"),
+        Output("k-sweep-progress", "max"),
+    ],
+)
+def sweep_cluster_counts(set_progress, file_data, scaling_method):
+    """
+    Fit every k of the slider in parallel once per dataset and scaler, so any
+    slider position is read from disk, and plot the elbow and silhouette.
+    """
+    layout = go.Layout(
+        xaxis_title="Number of Clusters",
+        yaxis=dict(title="Inertia"),
+        yaxis2=dict(title="Silhouette", overlaying="y", side="right"),
+        plot_bgcolor="rgba(0,0,0,0)",
+        paper_bgcolor="rgba(0,0,0,0)",
+        height=300,
+        showlegend=False,
+    )
+    key = file_data.get("datasetId") if file_data else None
+    if not key or is_streamed(key):
+        return go.Figure(layout=layout)
+    sweep = k_sweep(
+        key, scaling_method, progress=lambda done, total: set_progress((done, total))
+    )
+    if sweep is None:
+        return go.Figure(layout=layout)
+    return go.Figure(
+        data=[
+            go.Scatter(x=sweep["ks"], y=sweep["inertia"], name="Inertia"),
+            go.Scatter(
+                x=sweep["ks"], y=sweep["silhouette"], name="Silhouette", yaxis="y2"
+            ),
+        ],
+        layout=layout,
+    )
+
+
 @callback(
     Output("clustering-dialog","style"),
     Input("clustering-setting","n_clicks"),
@@ -1,5 +1,9 @@
-from dash import html, dcc, callback, Input, Output
+from dash import html, dcc, dash_table, callback, Input, Output
+from components.Button import Button
 from components.Typography import P
+from utils.ClusterPipeline import EMBEDDING_METHODS
+
+EMBEDDING_LABELS = {"tsne": "t-SNE", "umap": "UMAP"}
 
 
 def ClusteringDialog():
@@ -47,6 +51,121 @@ def ClusteringDialog():
                             ],
                             className="mb-4",
                         ),
+                        # Clustering Mode Dropdown
+                        html.Div(
+                            [
+                                P("Clustering Mode", variant="body2", className="mb-2"),
+                                dcc.Dropdown(
+                                    id="clustering-mode-dropdown",
+                                    options=[
+                                        {"label": "Full K-Means", "value": "full"},
+                                        {
+                                            "label": "Mini-batch (large datasets)",
+                                            "value": "minibatch",
+                                        },
+                                        {"label": "DBSCAN", "value": "dbscan"},
+                                        {"label": "HDBSCAN", "value": "hdbscan"},
+                                    ],
+                                    value="full",
+                                    clearable=False,
+                                ),
+                            ],
+                            className="mb-4",
+                        ),
+                        # Density Clustering Settings
+                        html.Div(
+                            [
+                                P(
+                                    "Neighborhood Radius (DBSCAN)",
+                                    variant="body2",
+                                    className="mb-2",
+                                ),
+                                dcc.Slider(
+                                    id="eps-slider",
+                                    min=0.05,
+                                    max=2,
+                                    step=0.05,
+                                    value=0.5,
+                                    marks={i / 2: str(i / 2) for i in range(5)},
+                                ),
+                                P(
+                                    "Minimum Samples (DBSCAN / HDBSCAN)",
+                                    variant="body2",
+                                    className="mb-2",
+                                ),
+                                dcc.Slider(
+                                    id="min-samples-slider",
+                                    min=2,
+                                    max=50,
+                                    step=1,
+                                    value=5,
+                                    marks={i: str(i) for i in [2, 10, 20, 30, 40, 50]},
+                                ),
+                            ],
+                            className="mb-4",
+                        ),
+                    ],
+                    className="p-4 bg-[#eeffff] rounded-lg",
+                ),
+                # Elbow and silhouette of every k, computed in the background
+                html.Div(
+                    [
+                        P("Choosing k", variant="body2", className="mb-2"),
+                        html.Progress(
+                            id="k-sweep-progress",
+                            value=0,
+                            max=100,
+                            className="w-full h-1",
+                            style={"display": "none"},
+                        ),
+                        dcc.Graph(
+                            id="k-sweep-graph",
+                            config={"displayModeBar": False, "displaylogo": False},
+                        ),
+                    ],
+                    className="p-4 bg-[#eeffff] rounded-lg",
+                ),
+                # Nonlinear embedding, fitted in the background and kept on disk
+                html.Div(
+                    [
+                        P("Nonlinear View", variant="body2", className="mb-2"),
+                        dcc.Dropdown(
+                            id="embedding-method-dropdown",
+                            options=[
+                                {"label": EMBEDDING_LABELS[method], "value": method}
+                                for method in EMBEDDING_METHODS
+                            ],
+                            value=EMBEDDING_METHODS[0],
+                            clearable=False,
+                            className="mb-2",
+                        ),
+                        P(
+                            "Perplexity / Neighbors",
+                            variant="body2",
+                            className="mb-2",
+                        ),
+                        dcc.Slider(
+                            id="embedding-perplexity-slider",
+                            min=5,
+                            max=50,
+                            step=5,
+                            value=30,
+                        ),
+                        Button(
+                            children="Compute embedding",
+                            variant="primary_ghost",
+                            size="sm",
+                            id="embedding-compute",
+                            n_clicks=0,
+                            className="w-fit",
+                        ),
+                        html.Progress(
+                            id="embedding-progress",
+                            value=0,
+                            max=100,
+                            className="w-full h-1 mt-2",
+                            style={"display": "none"},
+                        ),
                     ],
                     className="p-4 bg-[#eeffff] rounded-lg",
                 ),
@@ -59,7 +178,22 @@ def ClusteringDialog():
                 ),
                 # Cluster Summary
                 html.Div(
-                    id="cluster-summary",
+                    [
+                        html.Div(id="cluster-summary"),
+                        dcc.Store(id="cluster-profile"),
+                        dash_table.DataTable(
+                            id="cluster-profile-table",
+                            page_action="custom",
+                            page_current=0,
+                            page_size=10,
+                            style_table={"overflowX": "auto"},
+                            style_cell={"textAlign": "center", "minWidth": "100px"},
+                            style_header={
+                                "backgroundColor": "rgb(230, 230, 230)",
+                                "fontWeight": "bold",
+                            },
+                        ),
+                    ],
                     className="p-4 bg-[#eeffff] rounded-lg",
                 ),
             ],
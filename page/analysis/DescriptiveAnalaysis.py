@@ -1,4 +1,5 @@
-from dash import html, dcc, callback, Input, Output
+from dash import html, dcc, callback, ctx, Input, Output, State
+from dash.exceptions import PreventUpdate
 from components.Button import Button
 from components.Typography import P
 from dash_svg import Svg, Path
@@ -6,6 +7,10 @@ from dash_svg import Svg, Path
 import plotly.graph_objs as go
 import pandas as pd
 import numpy as np
+from utils.Downsample import POINT_BUDGET, downsample
+from utils.FrameCache import load_columns, load_profile
+from utils.Statistics import STATISTICS, approximate_statistics, selection_statistics
+from utils.Streaming import stream_statistics
 
 
 def DescriptiveAnalysis():
@@ -13,6 +18,7 @@ def DescriptiveAnalysis():
         [
             dcc.Store(id="file-store", storage_type="local"),
             dcc.Store(id="used-col-row", storage_type="local"),
+            dcc.Store(id="full-statistics"),
             html.Div(
                 [
                     Button(
@@ -149,6 +155,21 @@ def DescriptiveAnalysis():
                         id="buttons",
                         className="flex flex-col gap-4",
                     ),
+                    Button(
+                        children="Summarize full file",
+                        variant="primary_ghost",
+                        size="sm",
+                        id="full-summary",
+                        n_clicks=0,
+                        className="w-[230px]",
+                    ),
+                    html.Progress(
+                        id="full-summary-progress",
+                        value=0,
+                        max=100,
+                        className="w-[230px] h-1",
+                        style={"display": "none"},
+                    ),
                 ],
                 className="flex flex-col gap-4",
             ),
@@ -172,55 +193,81 @@ def DescriptiveAnalysis():
     Input("mean", "n_clicks_timestamp"),
     Input("median", "n_clicks_timestamp"),
     Input("mode", "n_clicks_timestamp"),
+    Input("full-statistics", "data"),
+    Input("mean-graph", "relayoutData"),
 )
-def loadData(file, usedColRow, mean, median, mode):
-    if int(mode) > int(mean) and int(mode) > int(mean):
+def loadData(file, usedColRow, mean, median, mode, fullStatistics, relayoutData):
+    if int(mode) > int(mean) and int(mode) > int(median):
         type = "mode"
     elif int(median) > int(mean) and int(median) > int(mode):
         type = "median"
     else:
         type = "mean"
-    if file["fileName"] and file["content"]:
-        df = pd.DataFrame(file["content"])
-        title = ""
-        clean_df = df.select_dtypes(include=np.number).dropna()
-        data = []
-        if usedColRow["useRow"] and usedColRow["useRow"] is True:
+    key = file.get("datasetId") if file else None
+    profile = load_profile(key)
+    if file["fileName"] and profile is not None:
+        usedColRow = usedColRow or {"useRow": False, "values": [], "label": None}
+        useRow = usedColRow["useRow"] is True
+        if useRow:
             title = "Descriptive Analytics(Using Rows)"
         else:
             title = "Descriptive Analytics(Using Columns)"
-        if type == "mean":
-            if usedColRow["useRow"] and usedColRow["useRow"] is True:
-                # iloc indexes can be used to access rows
-                data = clean_df.iloc[usedColRow["values"]].mean(axis=1)
-            else:
-                # selecting rows
-                data = clean_df[usedColRow["values"]].mean()
-        elif type == "median":
-            if usedColRow["useRow"] and usedColRow["useRow"] is True:
-                data = clean_df.iloc[usedColRow["values"]].median(axis=1)
-            else:
-                data = clean_df[usedColRow["values"]].mode()
+
+        if fullStatistics and fullStatistics["datasetId"] != key:
+            fullStatistics = None
+        # All three statistics are cached together, switching is a lookup
+        sketched = False
+        if (
+            fullStatistics
+            and not useRow
+            and fullStatistics["columns"] == summaryColumns(profile, usedColRow)
+        ):
+            summaries = fullStatistics["summaries"]
+            statistics = {
+                name: pd.Series(
+                    [fullStatistic(summaries[col], name) for col in summaries],
+                    index=pd.Index(fullStatistics["columns"]),
+                    dtype=np.float64,
+                )
+                for name in STATISTICS
+            }
+            title += " - full file"
+            sketched = True
+        elif usedColRow.get("approximate") and not useRow:
+            # Sketched chunk by chunk, works for streamed datasets as well
+            statistics = approximate_statistics(
+                key, usedColRow["values"], usedColRow.get("error") or 0.01
+            )
+            title += " - approximate"
+            sketched = True
+        elif profile.get("streamed"):
+            # Too large to load at once, only the chunked summary is shown
+            statistics = {name: pd.Series(dtype=np.float64) for name in STATISTICS}
+            title += (
+                " - too large for row statistics"
+                if useRow
+                else " - summarize the full file"
+            )
         else:
-            if usedColRow["useRow"] and usedColRow["useRow"] is True:
-                data = clean_df.iloc[usedColRow["values"]].median(axis=1)
-            else:
-                data = clean_df[usedColRow["values"]].mode()
-
-        x = clean_df.columns
-        if usedColRow["label"] and usedColRow["useRow"]:
-            x = df[usedColRow["label"]]
-        y = data
-
-        figure = go.Figure(
-            data=[go.Bar(x=x, y=y, marker=dict(color="white"))],
-            layout=go.Layout(
-                plot_bgcolor="rgba(0,0,0,0)",
-                paper_bgcolor="#D2E9E9",
-                height=300,
-                autosize=True,
-            ),
-        )
+            statistics = selection_statistics(key, useRow, usedColRow["values"])
+        y = statistics[type]
+        # Zooming only changes the figure of a downsampled series
+        zoomed = ctx.triggered_id == "mean-graph"
+        if zoomed and len(y) <= POINT_BUDGET:
+            raise PreventUpdate
+        x = y.index
+        if usedColRow["label"] and useRow and len(x):
+            x = load_columns(key, [usedColRow["label"]])[usedColRow["label"]].loc[x]
+        if sketched and type == "mode" and y.isna().any():
+            # Misra-Gries keeps no value of a column where none repeats often,
+            # e.g. a continuous one, so there is no mode to draw
+            x = [
+                f"{col} (no heavy hitter)" if missing else col
+                for col, missing in zip(x, y.isna())
+            ]
+            title += f", no value stands out in {int(y.isna().sum())} column(s)"
+
+        figure = barFigure(x, y, zoomWindow(relayoutData) if zoomed else None)
         return (
             [
                 file["fileName"],
@@ -231,11 +278,122 @@ def loadData(file, usedColRow, mean, median, mode):
             "active-svg" if type == "mean" else "",
             "active-svg" if type == "median" else "",
             "active-svg" if type == "mode" else "",
-            clean_df.shape[0],
-            clean_df.shape[1],
+            profile["completeRows"],
+            len(profile["numericColumns"]),
         )
 
 
+def zoomWindow(relayoutData):
+    """Visible x range after a zoom or pan, None once the view is reset"""
+    relayoutData = relayoutData or {}
+    if "xaxis.range[0]" in relayoutData:
+        return relayoutData["xaxis.range[0]"], relayoutData["xaxis.range[1]"]
+    if "xaxis.range" in relayoutData:
+        return tuple(relayoutData["xaxis.range"])
+    return None
+
+
+def barFigure(x, y, window=None):
+    """
+    Bar chart of the statistics. A series longer than POINT_BUDGET is drawn
+    by position and downsampled, and a zoom window downsamples only the
+    visible part again so detail comes back as the user zooms in.
+    """
+    layout = go.Layout(
+        plot_bgcolor="rgba(0,0,0,0)",
+        paper_bgcolor="#D2E9E9",
+        height=300,
+        autosize=True,
+    )
+    if len(y) <= POINT_BUDGET:
+        return go.Figure(
+            data=[go.Bar(x=x, y=y, marker=dict(color="white"))], layout=layout
+        )
+
+    values = y.to_numpy(dtype=np.float64)
+    labels = np.asarray(x).astype(str)
+    start, stop = 0, values.size
+    if window:
+        start = min(max(0, int(np.floor(window[0]))), values.size - 1)
+        stop = max(start + 1, min(values.size, int(np.ceil(window[1])) + 1))
+    keep = start + downsample(values[start:stop])
+    ticks = np.unique(keep[np.linspace(0, keep.size - 1, 10).astype(int)])
+    figure = go.Figure(
+        data=[
+            go.Bar(
+                x=keep,
+                y=values[keep],
+                customdata=labels[keep],
+                hovertemplate="%{customdata}: %{y}<extra></extra>",
+                marker=dict(color="white"),
+            )
+        ],
+        layout=layout,
+    )
+    figure.update_xaxes(
+        tickmode="array",
+        tickvals=ticks,
+        ticktext=labels[ticks],
+        range=list(window) if window else None,
+    )
+    return figure
+
+
+def summaryColumns(profile, usedColRow):
+    """Selected columns, or every numeric column when rows are selected"""
+    usedColRow = usedColRow or {}
+    if usedColRow.get("useRow") or not usedColRow.get("values"):
+        return profile["numericColumns"]
+    return [col for col in usedColRow["values"] if col in profile["numericColumns"]]
+
+
+def fullStatistic(summary, name):
+    if name == "median":
+        return summary["quantiles"]["50%"]
+    return summary[name]
+
+
+@callback(
+    Output("full-statistics", "data"),
+    Input("full-summary", "n_clicks"),
+    State("file-store", "data"),
+    State("used-col-row", "data"),
+    background=True,
+    running=[
+        (Output("full-summary", "disabled"), True, False),
+        (
+            Output("full-summary-progress", "style"),
+            {"display": "block"},
+            {"display": "none"},
+        ),
+    ],
+    progress=[
+        Output("full-summary-progress", "value"),
+        Output("full-summary-progress", "max"),
+    ],
+    prevent_initial_call=True,
+)
+def summarizeFullFile(set_progress, n_clicks, file, usedColRow):
+    """
+    Column statistics over the whole stored dataset, read chunk by chunk in a
+    background worker so files larger than its memory can be summarized.
+    """
+    key = file.get("datasetId") if file else None
+    profile = load_profile(key)
+    if profile is None:
+        return None
+    columns = summaryColumns(profile, usedColRow)
+    summaries = stream_statistics(
+        key,
+        columns,
+        (usedColRow or {}).get("error") or 0.01,
+        progress=lambda done, total: set_progress((done, total)),
+    )
+    if summaries is None:
+        return None
+    return {"datasetId": key, "columns": columns, "summaries": summaries}
+
+
 @callback(
     Output("data-dialog", "style", allow_duplicate=True),
     Input("uploaded-filename", "n_clicks"),
@@ -1,6 +1,4 @@
-import base64
 import torch
-import io
 import pandas as pd
 import torchvision.transforms as transform
 import seaborn as sns
@@ -12,6 +10,7 @@ import numpy as np
 import dash
 from components.Button import Button
 from components.Typography import P
+from components.ChunkedUpload import ChunkedUpload
 from PIL import Image
 from dash import (
     html,
@@ -32,6 +31,9 @@ from utils.utils import (
     compute_shap_values,
     plot_shap_heatmap,
 )
+from api.upload import uploadPath
+from utils.DatasetStore import file_dataset_id, get_dataset, has_dataset
+from utils.Ingest import ingest_csv
 
 # Initialize global variables
 image_tensors = []
@@ -48,6 +50,7 @@ transformer = transform.Compose(
 def Layout():
     return html.Div(
         children=[
+            dcc.Store(id="epsilon-dataset"),
             TensorAndModelConfig(),
             # Epsilon Slider Section
             html.Div(
@@ -193,9 +196,10 @@ def Layout():
                                     children=[
                                         Button(
                                             [
-                                                dcc.Upload(
+                                                ChunkedUpload(
                                                     children="Upload Labels CSV",
                                                     id="labels-upload",
+                                                    accept=".csv",
                                                 ),
                                             ],
                                             variant="primary",
@@ -230,10 +234,10 @@ def Layout():
 
 @callback(
     Output("labels-upload-button", "style"),
-    Input("model-upload", "contents"),
+    Input("model-upload", "data"),
 )
-def show_labels_upload_button(model_contents):
-    if model_contents is not None:
+def show_labels_upload_button(model_upload):
+    if model_upload is not None:
         return {"display": "block"}  # Show the button
     return {"display": "none"}  # Hide the button
 
@@ -251,18 +255,16 @@ def show_labels_upload_button(model_contents):
 
 @callback(
     Output("label-inputs", "children", allow_duplicate=True),
-    Input("labels-upload", "contents"),
+    Input("labels-upload", "data"),
     prevent_initial_call=True,
 )
-def handle_labels_upload(label_contents):
-    if label_contents is None:
+def handle_labels_upload(label_upload):
+    label_path = uploadPath(label_upload["uploadId"]) if label_upload else None
+    if label_path is None:
         return dash.no_update
 
-    # Decode the uploaded CSV file
-    label_content_type, label_content_string = label_contents.split(",")
-    label_decoded = io.BytesIO(base64.b64decode(label_content_string))
     try:
-        df = pd.read_csv(label_decoded)
+        df = pd.read_csv(label_path)
         print(df)
         labels = df.iloc[:, 0].values
 
@@ -350,22 +352,26 @@ def close_dialog(n_clicks):
     Output("model-name", "style"),
     Output("label-dialog", "style"),
     Output("label-inputs", "children", allow_duplicate=True),
-    Input("model-upload", "contents"),
-    State("model-upload", "filename"),
+    Input("model-upload", "data"),
     State("dim-batch", "value"),
     State("dim-channels", "value"),
     State("dim-height", "value"),
     State("dim-width", "value"),
     prevent_initial_call=True,
 )
-def handleFileUpload(contents, filename, batch, channels, height, width):
-    content_type, content_string = contents.split(",")
-    decoded = io.BytesIO(base64.b64decode(content_string))
-    model: torch.jit.ScriptModule = torch.jit.load(decoded)
-
+def handleFileUpload(model_upload, batch, channels, height, width):
     # Check for CUDA support
     device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-    model.to(device)  # Move the model to the right device
+    try:
+        model: torch.jit.ScriptModule = load_model(model_upload, device)
+    except Exception as e:
+        print(f"Error loading model: {e}")
+        return (
+            f" - Error: Unable to load model ({e})",
+            {"display": "block"},
+            {"display": "none"},
+            [],
+        )
 
     # Update global tensor shape based on current values in the UI
     global input_tensor_shape, labels_map
@@ -430,38 +436,38 @@ def handleFileUpload(contents, filename, batch, channels, height, width):
         Output("dataset-upload-button", "disabled", allow_duplicate=True),
         Output("model-upload-button", "disabled", allow_duplicate=True),
         Output("shap-visualization-before", "children"),
+        Output("epsilon-dataset", "data"),
     ],
-    Input("dataset-upload", "contents"),
-    State("model-upload", "contents"),
+    Input("dataset-upload", "data"),
+    State("model-upload", "data"),
     State("dim-batch", "value"),
     State("dim-channels", "value"),
     State("dim-height", "value"),
     State("dim-width", "value"),
     prevent_initial_call=True,
 )
-def handle_csv_upload(contents, model_contents, batch, channels, height, width):
-    if contents is None:
-        return "Please upload a CSV file.", "", {}, {}, {}, False, False, ""
+def handle_csv_upload(dataset_upload, model_upload, batch, channels, height, width):
+    dataset_path = uploadPath(dataset_upload["uploadId"]) if dataset_upload else None
+    if dataset_path is None:
+        return "Please upload a CSV file.", "", {}, {}, {}, False, False, "", None
 
-    if model_contents is None:
-        return "Please upload a model first.", "", {}, {}, {}, False, False, ""
-
-    # Decode the uploaded CSV file
-    content_type, content_string = contents.split(",")
-    decoded = io.BytesIO(base64.b64decode(content_string))
-
-    # Decode the uploaded model
-    model_content_type, model_content_string = model_contents.split(",")
-    model_decoded = io.BytesIO(base64.b64decode(model_content_string))
-    model = torch.jit.load(model_decoded)
+    if model_upload is None:
+        return "Please upload a model first.", "", {}, {}, {}, False, False, "", None
 
     # Check for CUDA support
     device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-    model.to(device)  # Move the model to the right device
 
     try:
-        # Process the CSV file containing images and labels
-        df = pd.read_csv(decoded)
+        model = load_model(model_upload, device)
+
+        # Process the CSV file containing images and labels, parsed once and
+        # stored so the attack callback reads it back without parsing
+        key = file_dataset_id(dataset_path)
+        if not has_dataset(key):
+            # Pixel columns are not profiled, only the attack reads them
+            info = ingest_csv(key, dataset_path, profile=False)
+            print(f"Stored dataset {key}: {info['memory']}")
+        df = get_dataset(key)
 
         # Split the data into images and labels
         images = df.iloc[:, 1:].values  # All columns except the first (labels)
@@ -588,6 +594,7 @@ def handle_csv_upload(contents, model_contents, batch, channels, height, width):
             False,
             False,
             shap_plot,
+            {"datasetId": key},
         )
 
     except Exception as e:
@@ -601,6 +608,7 @@ def handle_csv_upload(contents, model_contents, batch, channels, height, width):
             False,
             False,
             html.Div(""),
+            None,
         )
 
 
@@ -616,18 +624,16 @@ def handle_csv_upload(contents, model_contents, batch, channels, height, width):
         Output("shap-visualization-after", "children"),
     ],
     Input("epsilon-slider", "value"),
-    State("dataset-upload", "contents"),
-    State("model-upload", "contents"),
+    State("epsilon-dataset", "data"),
+    State("model-upload", "data"),
     State("dim-batch", "value"),
     State("dim-channels", "value"),
     State("dim-height", "value"),
     State("dim-width", "value"),
     prevent_initial_call=True,
 )
-def handle_fgsm_attack(
-    epsilon, dataset_contents, model_contents, batch, channels, height, width
-):
-    if dataset_contents is None or model_contents is None:
+def handle_fgsm_attack(epsilon, dataset, model_upload, batch, channels, height, width):
+    if not dataset or not has_dataset(dataset.get("datasetId")) or model_upload is None:
         return (
             html.Div("Please upload the dataset and model before running the attack."),
             "",
@@ -640,18 +646,9 @@ def handle_fgsm_attack(
         )
 
     try:
-        # Decode dataset contents
-        content_type, content_string = dataset_contents.split(",")
-        dataset_decoded = io.BytesIO(base64.b64decode(content_string))
-
-        # Decode model contents
-        model_content_type, model_content_string = model_contents.split(",")
-        model_decoded = io.BytesIO(base64.b64decode(model_content_string))
-        model = torch.jit.load(model_decoded)
-
         # Check for CUDA support
         device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-        model.to(device)
+        model = load_model(model_upload, device)
         model.eval()
 
         # Update transformer based on current dimensions
@@ -664,8 +661,8 @@ def handle_fgsm_attack(
             ]
         )
 
-        # Process CSV file
-        df = pd.read_csv(dataset_decoded)
+        # Load the stored dataset, memory mapped instead of parsing the CSV again
+        df = get_dataset(dataset["datasetId"])
         images = df.iloc[:, 1:].values  # All columns except the first (labels)
         labels = df.iloc[:, 0].values  # The first column is the label
 
@@ -796,11 +793,11 @@ def handle_fgsm_attack(
     Output("loading-shap-before", "style"),
     Output("dataset-upload-button", "disabled"),
     Output("model-upload-button", "disabled"),
-    Input("dataset-upload", "contents"),
-    State("model-upload", "contents"),
+    Input("dataset-upload", "data"),
+    State("model-upload", "data"),
     prevent_initial_call=True,
 )
-def onBeforeCalculation(contents, model):
+def onBeforeCalculation(dataset_upload, model_upload):
     return {"display": "block"}, {"display": "block"}, {"display": "block"}, True, True
 
 
@@ -817,6 +814,14 @@ def onAfterCalculation(epsilon):
     return {"display": "block"}, {"display": "block"}, {"display": "block"}, [], []
 
 
+def load_model(model_upload, device):
+    """Load the uploaded TorchScript model straight from the upload on disk"""
+    model_path = uploadPath(model_upload["uploadId"]) if model_upload else None
+    if model_path is None:
+        raise FileNotFoundError("Model upload is missing, please upload it again")
+    return torch.jit.load(model_path, map_location=device)
+
+
 def update_labels_map(num_classes):
     """
     Update the labels_map dictionary based on the number of output classes in the model
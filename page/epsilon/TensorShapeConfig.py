@@ -2,6 +2,7 @@ import torchvision.transforms as transform
 from dash import html, dcc, Output, Input, State, callback
 from components.Button import Button
 from components.Typography import P
+from components.ChunkedUpload import ChunkedUpload
 
 
 def TensorAndModelConfig():
@@ -80,7 +81,7 @@ def TensorAndModelConfig():
                 children=[
                     Button(
                         [
-                            dcc.Upload(children="Model upload", id="model-upload"),
+                            ChunkedUpload(children="Model upload", id="model-upload"),
                             html.Div(
                                 children="File name",
                                 id="model-name",
@@ -111,9 +112,10 @@ def TensorAndModelConfig():
                 children=[
                     Button(
                         [
-                            dcc.Upload(
+                            ChunkedUpload(
                                 children="Dataset upload (CSV)",
                                 id="dataset-upload",
+                                accept=".csv",
                             ),
                         ],
                         variant="primary",
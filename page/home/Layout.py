@@ -1,10 +1,11 @@
 from components.Button import Button
 from components.Typography import P
-from dash import html, dcc, callback, Input, Output, State
+from components.ChunkedUpload import ChunkedUpload
+from dash import html, dcc, callback, Input, Output
 import dash
-import base64
-import io
-import pandas as pd
+from api.upload import uploadPath
+from utils.DatasetStore import file_dataset_id, dataset_meta, has_dataset
+from utils.Ingest import ingest_csv, format_bytes
 
 
 def Layout():
@@ -18,7 +19,7 @@ def Layout():
                         variant="heading1",
                         className="text-center",
                     ),
-                    dcc.Upload(
+                    ChunkedUpload(
                         children=[
                             P(
                                 "Upload CSV file to get started...",
@@ -40,6 +41,14 @@ def Layout():
                         id="file-upload",
                         className="w-[826px] block group flex items-center justify-between mx-auto p-3 rounded-xl bg-[#D2E9E9] cursor-pointer",
                     ),
+                    # Large files are stored in the background, two passes over the file
+                    html.Progress(
+                        id="ingest-progress",
+                        value=0,
+                        max=100,
+                        className="w-[826px] h-1",
+                        style={"display": "none"},
+                    ),
                     Button(
                         children="Start Analysing",
                         id="start-analyse",
@@ -78,19 +87,33 @@ def Layout():
     Output("filename", "children", allow_duplicate=True),
     Output("file-store", "data"),
     Output("start-analyse", "disable_n_clicks", allow_duplicate=True),
-    Input("file-upload", "contents"),
-    State("file-upload", "filename"),
+    Input("file-upload", "data"),
+    background=True,
+    running=[
+        (
+            Output("ingest-progress", "style"),
+            {"display": "block"},
+            {"display": "none"},
+        ),
+    ],
+    progress=[
+        Output("ingest-progress", "value"),
+        Output("ingest-progress", "max"),
+    ],
     prevent_initial_call=True,
 )
-def handleFileUpload(contents, filename):
-    if contents is None:
+def handleFileUpload(set_progress, upload):
+    """Parse and store the uploaded file in a background worker"""
+    path = uploadPath(upload["uploadId"]) if upload else None
+    if path is None:
         return dash.no_update
-    content_type, content_string = contents.split(",")
-    decoded = base64.b64decode(content_string)
-    df = pd.read_csv(io.StringIO(decoded.decode("utf-8")))
+    key = file_dataset_id(path)
+    if not has_dataset(key):
+        ingest_csv(key, path, progress=lambda done, total: set_progress((done, total)))
+    meta = dataset_meta(key, upload["fileName"])
     return (
-        filename,
-        {"fileName": filename, "content": df.to_dict("records")},
+        uploadedFileName(meta),
+        meta,
         False,
     )
 
@@ -101,7 +124,18 @@ def handleFileUpload(contents, filename):
     Input("file-store", "data"),
 )
 def getPreviousData(file):
-    if file and file["content"] and file["fileName"]:
-        return file["fileName"], False
+    if file and file.get("fileName") and has_dataset(file.get("datasetId")):
+        return uploadedFileName(file), False
     else:
         return "Upload CSV file to get started...", True
+
+
+def uploadedFileName(file):
+    """File name with the memory saved by the compact column types"""
+    memory = file.get("memory")
+    if not memory:
+        return file["fileName"]
+    return (
+        f"{file['fileName']} ({format_bytes(memory['parsedBytes'])} parsed, "
+        f"{format_bytes(memory['storedBytes'])} stored)"
+    )
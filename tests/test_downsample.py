@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+from utils.Downsample import lttb_indices, min_max_indices
+
+
+def series(n=100_000, seed=0):
+    return np.cumsum(np.random.default_rng(seed).normal(size=n))
+
+
+@pytest.mark.parametrize("indices", [min_max_indices, lttb_indices])
+def test_short_series_is_kept_whole(indices):
+    y = series(500)
+    assert np.array_equal(indices(y, 2000), np.arange(500))
+
+
+@pytest.mark.parametrize("indices", [min_max_indices, lttb_indices])
+def test_positions_are_sorted_unique_and_within_budget(indices):
+    y = series()
+    picked = indices(y, 2000)
+    assert 0 < picked.size <= 2000
+    assert np.all(np.diff(picked) > 0)
+    assert picked[0] >= 0 and picked[-1] < y.size
+
+
+def test_min_max_keeps_every_bucket_extreme():
+    y = series()
+    budget = 1000
+    picked = set(min_max_indices(y, budget).tolist())
+    buckets = budget // 2
+    starts = np.arange(buckets) * y.size // buckets
+    for start, stop in zip(starts, np.r_[starts[1:], y.size]):
+        bucket = y[start:stop]
+        assert start + int(bucket.argmin()) in picked
+        assert start + int(bucket.argmax()) in picked
+
+
+def test_min_max_keeps_a_single_spike():
+    y = np.zeros(50_000)
+    y[12_345] = 100.0
+    y[40_000] = -100.0
+    picked = min_max_indices(y, 100)
+    assert 12_345 in picked and 40_000 in picked
+
+
+def test_min_max_never_picks_nan_over_a_number():
+    y = series(10_000)
+    y[::3] = np.nan
+    picked = min_max_indices(y, 200)
+    assert not np.isnan(y[picked]).any()
+
+
+def test_lttb_uses_the_whole_budget_and_keeps_the_ends():
+    y = series()
+    picked = lttb_indices(y, 1500)
+    assert picked.size == 1500
+    assert picked[0] == 0 and picked[-1] == y.size - 1
+
+
+def test_lttb_picks_one_point_per_bucket():
+    y = series(20_000)
+    budget = 400
+    picked = lttb_indices(y, budget)
+    edges = np.linspace(1, y.size - 1, budget - 1).astype(int)
+    inner = picked[1:-1]
+    assert np.all((inner >= edges[:-1]) & (inner < edges[1:]))
+
+
+def test_lttb_keeps_a_single_spike():
+    y = np.zeros(50_000)
+    y[25_000] = 100.0
+    assert 25_000 in lttb_indices(y, 100)
@@ -0,0 +1,50 @@
+import numpy as np
+import pyarrow as pa
+from utils.Ingest import fits_float32, read_csv_compact, scan_csv, stream_profile
+from utils.Profile import profile_frame
+
+
+def test_large_ids_and_timestamps_stay_float64():
+    raw = (
+        b"id,ts\n"
+        b"123456789.5,1700000000.123\n"
+        b"123456790.5,1700000001.456\n"
+        b"123456791.5,1700000002.789\n"
+    )
+    table, _ = read_csv_compact(raw)
+    assert table.schema.field("id").type == pa.float64()
+    assert table.schema.field("ts").type == pa.float64()
+    assert table.column("id").to_pylist() == [123456789.5, 123456790.5, 123456791.5]
+    assert len(set(table.column("ts").to_pylist())) == 3
+
+
+def test_exact_floats_are_stored_as_float32():
+    table, report = read_csv_compact(b"x,n\n0.5,1\n1.25,2\n,3\n-3.75,4\n")
+    assert table.schema.field("x").type == pa.float32()
+    assert table.column("x").to_pylist() == [0.5, 1.25, None, -3.75]
+    assert report["storedBytes"] < report["parsedBytes"]
+
+
+def test_fits_float32_is_exact():
+    assert fits_float32(np.array([0.5, np.nan, -2.0, np.inf]))
+    assert not fits_float32(np.array([0.1]))
+    assert not fits_float32(np.array([1e300]))
+    assert not fits_float32(np.array([1700000000.123]))
+
+
+def test_empty_string_fields_are_missing():
+    raw = b"label,x\na,1\nb,2\n,3\nc,4\na,5\nb,6\n"
+    table, _ = read_csv_compact(raw)
+    assert table.column("label").null_count == 1
+    profile = profile_frame(table.to_pandas())
+    assert profile["columns"]["label"]["nulls"] == 1
+    assert profile["columns"]["label"]["cardinality"] == 3
+
+
+def test_streamed_scan_keeps_empty_strings_missing(tmp_path):
+    path = tmp_path / "rows.csv"
+    path.write_bytes(b"label,x\n" + b"a,1\n,2\nb,3\n" * 1000)
+    schema, scans, rows, _, incomplete = scan_csv(str(path), True)
+    label = stream_profile(schema, scans, rows, incomplete)["columns"]["label"]
+    assert label["nulls"] == 1000
+    assert label["cardinality"] == 2
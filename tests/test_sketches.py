@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+from utils.Sketches import KLLSketch, HeavyHitters
+
+ERROR = 0.01
+
+
+def rank_error(values: np.ndarray, estimate: float, q: float):
+    """Distance between the rank of an estimate and the requested rank, as a share"""
+    ordered = np.sort(values)
+    low = np.searchsorted(ordered, estimate, side="left")
+    high = np.searchsorted(ordered, estimate, side="right")
+    target = q * values.size
+    if low <= target <= high:
+        return 0.0
+    return min(abs(low - target), abs(high - target)) / values.size
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_kll_quantiles_within_rank_error(seed):
+    values = np.random.default_rng(seed).lognormal(size=200_000)
+    sketch = KLLSketch.for_error(ERROR, seed=seed)
+    for start in range(0, values.size, 10_000):
+        sketch.update(values[start : start + 10_000])
+    assert sketch.n == values.size
+    qs = [0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99]
+    for q, estimate in zip(qs, sketch.quantiles(qs)):
+        assert rank_error(values, estimate, q) <= 2 * ERROR
+
+
+def test_kll_size_does_not_grow_with_the_stream():
+    sketch = KLLSketch.for_error(ERROR, seed=0)
+    rng = np.random.default_rng(0)
+    for _ in range(50):
+        sketch.update(rng.normal(size=20_000))
+    retained = sum(level.size for level in sketch.levels)
+    assert retained <= 4 * sketch.k
+
+
+def test_kll_merge_matches_one_stream():
+    values = np.random.default_rng(3).normal(size=100_000)
+    left = KLLSketch.for_error(ERROR, seed=0).update(values[:60_000])
+    right = KLLSketch.for_error(ERROR, seed=1).update(values[60_000:])
+    merged = left.merge(right)
+    assert merged.n == values.size
+    assert rank_error(values, merged.quantile(0.5), 0.5) <= 2 * ERROR
+
+
+def test_kll_ignores_nan_and_empty():
+    sketch = KLLSketch.for_error(ERROR, seed=0)
+    assert np.isnan(sketch.quantile(0.5))
+    sketch.update([np.nan, 1.0, np.nan, 3.0, 2.0])
+    assert sketch.n == 3
+    assert sketch.quantile(0.5) == 2.0
+
+
+def skewed_stream(seed=0):
+    rng = np.random.default_rng(seed)
+    # A few heavy values on top of a long tail of distinct ones
+    heavy = rng.choice([1.0, 2.0, 3.0], size=30_000, p=[0.5, 0.3, 0.2])
+    tail = rng.integers(10, 100_000, size=70_000).astype(np.float64)
+    return rng.permutation(np.concatenate([heavy, tail]))
+
+
+def check_misra_gries_bound(summary: HeavyHitters, values: np.ndarray):
+    unique, counts = np.unique(values, return_counts=True)
+    true = dict(zip(unique, counts))
+    tracked = dict(zip(summary.values, summary.counts))
+    assert len(tracked) <= summary.size
+    for value, count in true.items():
+        estimate = tracked.get(value, 0)
+        # Never over-counted, under-counted by at most n / (size + 1)
+        assert estimate <= count
+        assert count - estimate <= summary.error()
+        if count > summary.error():
+            assert value in tracked
+
+
+def test_heavy_hitters_error_bound():
+    values = skewed_stream()
+    summary = HeavyHitters.for_error(ERROR)
+    for start in range(0, values.size, 8_192):
+        summary.update(values[start : start + 8_192])
+    assert summary.n == values.size
+    check_misra_gries_bound(summary, values)
+    assert summary.mode() == 1.0
+
+
+def test_heavy_hitters_merge_keeps_the_bound():
+    values = skewed_stream(1)
+    left = HeavyHitters.for_error(ERROR).update(values[:50_000])
+    right = HeavyHitters.for_error(ERROR).update(values[50_000:])
+    merged = left.merge(right)
+    assert merged.n == values.size
+    check_misra_gries_bound(merged, values)
+
+
+def test_heavy_hitters_empty_mode_is_nan():
+    assert np.isnan(HeavyHitters(size=10).mode())
@@ -0,0 +1,570 @@
+import os
+import math
+import time
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+from scipy.stats import loguniform
+from joblib import Parallel, delayed
+from threadpoolctl import threadpool_limits
+from sklearn.ensemble import (
+    AdaBoostClassifier,
+    HistGradientBoostingClassifier,
+    RandomForestClassifier,
+)
+from sklearn.linear_model import SGDClassifier
+from sklearn.naive_bayes import GaussianNB
+from sklearn.preprocessing import StandardScaler
+from sklearn.model_selection import (
+    KFold,
+    ParameterSampler,
+    StratifiedKFold,
+    train_test_split,
+)
+from sklearn.metrics import classification_report, accuracy_score, confusion_matrix
+from utils.DatasetStore import count_chunks, dataset_schema, iter_chunks, read_schema
+from utils.FrameCache import frames, load_columns
+from utils.ModelCache import get_trained, put_trained
+from utils.Streaming import numeric_values
+
+# Classifiers offered on the classifier page, all trained at once in
+# comparison mode
+ALGORITHMS = ["adaboost", "randomforest", "histgradient"]
+ALGORITHM_LABELS = {
+    "adaboost": "AdaBoost",
+    "randomforest": "Random Forest",
+    "histgradient": "Histogram Gradient Boosting",
+}
+# Histogram gradient boosting trains on features binned once per dataset into
+# uint8 codes: up to MAX_BINS quantile bins from a sample of BIN_SAMPLE_ROWS,
+# with MISSING_BIN for missing values. It stops once the score on a held out
+# VALIDATION_FRACTION of the training rows hasn't improved for STOP_ROUNDS.
+MAX_BINS = 254
+MISSING_BIN = MAX_BINS
+BIN_SAMPLE_ROWS = 200_000
+MAX_ITERATIONS = 500
+VALIDATION_FRACTION = 0.1
+STOP_ROUNDS = 10
+# Cross-validation fold counts offered besides the single train/test split
+CV_FOLDS = [3, 5, 10]
+# Hyperparameter search: successive halving over SEARCH_CANDIDATES random
+# settings. Every round fits the survivors on HALVING_FACTOR times more of the
+# training rows and keeps the best 1 / HALVING_FACTOR by accuracy on a
+# held out SEARCH_VALIDATION share of the training rows.
+SEARCH_SPACES = {
+    "adaboost": {
+        "n_estimators": [25, 50, 100, 200, 400],
+        "learning_rate": loguniform(0.01, 2),
+    },
+    "randomforest": {
+        "n_estimators": [50, 100, 200, 400],
+        "max_depth": [None, 8, 16, 32],
+        "min_samples_leaf": [1, 2, 5, 10],
+        "max_features": ["sqrt", "log2", None],
+    },
+    "histgradient": {
+        "learning_rate": loguniform(0.01, 0.5),
+        "max_leaf_nodes": [15, 31, 63, 127],
+        "min_samples_leaf": [5, 20, 50, 100],
+        "l2_regularization": loguniform(1e-4, 10),
+    },
+}
+SEARCH_CANDIDATES = 27
+HALVING_FACTOR = 3
+MIN_SEARCH_ROWS = 200
+SEARCH_VALIDATION = 0.2
+# Out-of-core learners, trained with partial_fit one stored chunk at a time so
+# memory stays flat however large the dataset is
+STREAM_ALGORITHMS = ["sgd", "naivebayes"]
+STREAM_LABELS = {"sgd": "SGD (logistic loss)", "naivebayes": "Gaussian Naive Bayes"}
+
+
+def make_model(algorithm: str, cores=1, params=None):
+    if algorithm == "adaboost":
+        model = AdaBoostClassifier(random_state=42)
+    elif algorithm == "randomforest":
+        model = RandomForestClassifier(random_state=42, n_jobs=cores)
+    elif algorithm == "histgradient":
+        model = HistGradientBoostingClassifier(
+            max_iter=MAX_ITERATIONS,
+            max_bins=MAX_BINS + 1,  # the codes already are the bins
+            early_stopping=True,
+            validation_fraction=VALIDATION_FRACTION,
+            n_iter_no_change=STOP_ROUNDS,
+            random_state=42,
+        )
+    else:
+        raise ValueError(f"Unknown classifier: {algorithm}")
+    return model.set_params(**(params or {}))
+
+
+def bin_edges(values: np.ndarray, rng):
+    """Thresholds between the quantile bins of one column"""
+    values = values[~np.isnan(values)]
+    if values.size > BIN_SAMPLE_ROWS:
+        values = rng.choice(values, BIN_SAMPLE_ROWS, replace=False)
+    distinct = np.unique(values)
+    if distinct.size <= MAX_BINS:
+        return (distinct[:-1] + distinct[1:]) / 2
+    return np.unique(
+        np.percentile(
+            values, np.linspace(0, 100, MAX_BINS + 1)[1:-1], method="midpoint"
+        )
+    )
+
+
+def bin_features(x: np.ndarray, edges):
+    """uint8 bin codes of a float matrix, column by column"""
+    codes = np.empty(x.shape, dtype=np.uint8, order="F")
+    for j, thresholds in enumerate(edges):
+        column = x[:, j]
+        codes[:, j] = np.searchsorted(thresholds, column, side="right")
+        codes[np.isnan(column), j] = MISSING_BIN
+    return codes
+
+
+def binned_features(key: str, x):
+    """Binned matrix and bin thresholds of the feature frame of a dataset"""
+
+    def build():
+        rng = np.random.default_rng(0)
+        values = x.to_numpy(dtype=np.float64)
+        edges = [bin_edges(values[:, j], rng) for j in range(values.shape[1])]
+        return bin_features(values, edges), edges
+
+    return frames.get_or_build((key, "binned", tuple(x.columns)), build)
+
+
+def training_data(key: str, config: dict):
+    """
+    Numeric feature matrix and target of a dataset, plus the bin thresholds
+    when the algorithm trains on binned features. None when the dataset is gone.
+    """
+    xColumns, yColumns = config["features"], config["target"]
+    df = load_columns(key, dict.fromkeys([*xColumns, yColumns]))
+    if df is None:
+        return None
+
+    x = df[xColumns].select_dtypes(include="number")
+    edges = None
+    if config["algorithm"] == "histgradient":
+        x, edges = binned_features(key, x)
+    else:
+        x = x.to_numpy()
+    y = df[yColumns]
+    if y.dtype.kind == "f":  # float64 or the downcast float32
+        y = y.astype(int)
+    return x, y.to_numpy(), edges
+
+
+def training_split(key: str, config: dict):
+    """
+    Train and test split of training_data() with its bin thresholds. Returns
+    None when the dataset is gone, raises ValueError when the sizes don't fit
+    the data.
+    """
+    data = training_data(key, config)
+    if data is None:
+        return None
+    x, y, edges = data
+    split = train_test_split(
+        x,
+        y,
+        test_size=config["testSize"],
+        train_size=config["trainSize"],
+        random_state=42,
+    )
+    return split, edges
+
+
+def fit_model(algorithm: str, split, cores=1, params=None):
+    """Fitted model with its test predictions, report and timings"""
+    x_train, x_test, y_train, y_test = split
+    model = make_model(algorithm, cores, params)
+    # Random forest builds trees on `cores` threads, gradient boosting splits
+    # histograms on as many OpenMP threads
+    with threadpool_limits(cores):
+        start = time.perf_counter()
+        model.fit(x_train, y_train)
+        fitted = time.perf_counter()
+        y_pred = model.predict(x_test)
+        predicted = time.perf_counter()
+    return {
+        "model": model,
+        "predictions": y_pred,
+        "report": classification_report(y_test, y_pred, output_dict=True),
+        "accuracy": accuracy_score(y_test, y_pred),
+        "fitSeconds": fitted - start,
+        "predictSeconds": predicted - fitted,
+        "testRows": len(y_test),
+        "iterations": getattr(model, "n_iter_", None),
+    }
+
+
+def train_classifier(key: str, config: dict):
+    """Fit the configured classifier on every core and store the result"""
+    prepared = training_split(key, config)
+    if prepared is None:
+        return None
+    split, edges = prepared
+    result = fit_model(config["algorithm"], split, os.cpu_count() or 1)
+    result["binEdges"] = edges
+    return put_trained(key, config, result)
+
+
+def core_shares(algorithms):
+    """
+    AdaBoost boosts one stage after the other on a single core, the cores
+    left are split between the models that build trees in parallel.
+    """
+    cores = os.cpu_count() or 1
+    threaded = [a for a in algorithms if a != "adaboost"]
+    free = max(1, cores - (len(algorithms) - len(threaded)))
+    share = max(1, free // max(1, len(threaded)))
+    return {a: share if a in threaded else 1 for a in algorithms}
+
+
+def compare_classifiers(key: str, config: dict, algorithms=ALGORITHMS):
+    """
+    Results of every algorithm on the same split, keyed by algorithm. The ones
+    not trained yet are fitted at the same time in a process pool.
+    Returns None when the dataset is gone.
+    """
+    configs = {a: {**config, "algorithm": a} for a in algorithms}
+    results = {a: get_trained(key, configs[a]) for a in algorithms}
+    missing = [a for a in algorithms if results[a] is None]
+    if missing:
+        prepared = {a: training_split(key, configs[a]) for a in missing}
+        if any(p is None for p in prepared.values()):
+            return None
+        shares = core_shares(missing)
+        # Large arrays of the split are memory mapped into the workers
+        fitted = Parallel(n_jobs=len(missing))(
+            delayed(fit_model)(a, prepared[a][0], shares[a]) for a in missing
+        )
+        for algorithm, result in zip(missing, fitted):
+            result["binEdges"] = prepared[algorithm][1]
+            results[algorithm] = put_trained(key, configs[algorithm], result)
+    return results
+
+
+def fold_indices(key: str, target: str, y, folds: int):
+    """
+    Train and test row positions of every fold, stratified by the target when
+    each class has a row for every fold. Cached per dataset and target.
+    """
+
+    def build():
+        _, counts = np.unique(y, return_counts=True)
+        splitter = StratifiedKFold if counts.min() >= folds else KFold
+        splits = splitter(folds, shuffle=True, random_state=42).split(
+            np.zeros(len(y)), y
+        )
+        return [
+            (train.astype(np.int32), test.astype(np.int32)) for train, test in splits
+        ]
+
+    return frames.get_or_build((key, "folds", target, folds), build)
+
+
+def fit_fold(algorithm: str, x, y, train, test, cores=1):
+    """Scores and timings of one fold, the model itself is not kept"""
+    result = fit_model(algorithm, (x[train], x[test], y[train], y[test]), cores)
+    average = result["report"]["macro avg"]
+    return {
+        "accuracy": result["accuracy"],
+        "precision": average["precision"],
+        "recall": average["recall"],
+        "f1-score": average["f1-score"],
+        "fitSeconds": result["fitSeconds"],
+        "predictSeconds": result["predictSeconds"],
+        "testRows": result["testRows"],
+    }
+
+
+def cross_validate(key: str, config: dict, folds: int):
+    """
+    Scores of every fold with their mean and standard deviation, the folds
+    fitted at the same time in a process pool. The split sizes don't apply,
+    every row is tested once. Returns None when the dataset is gone.
+    """
+    config = {k: v for k, v in config.items() if k not in ("testSize", "trainSize")}
+    config["folds"] = folds
+    result = get_trained(key, config)
+    if result is not None:
+        return result
+    data = training_data(key, config)
+    if data is None:
+        return None
+    x, y, _ = data
+    indices = fold_indices(key, config["target"], y, folds)
+    jobs = min(folds, os.cpu_count() or 1)
+    cores = max(1, (os.cpu_count() or 1) // jobs)
+    start = time.perf_counter()
+    scores = Parallel(n_jobs=jobs)(
+        delayed(fit_fold)(config["algorithm"], x, y, train, test, cores)
+        for train, test in indices
+    )
+    metrics = ["accuracy", "precision", "recall", "f1-score"]
+    return put_trained(
+        key,
+        config,
+        {
+            "folds": scores,
+            "mean": {m: float(np.mean([s[m] for s in scores])) for m in metrics},
+            "std": {m: float(np.std([s[m] for s in scores])) for m in metrics},
+            "wallSeconds": time.perf_counter() - start,
+        },
+    )
+
+
+def halving_rounds(candidates: int, rows: int):
+    """(candidates, training rows) of every round, the last one on all rows"""
+    counts = []
+    while candidates > 1:
+        counts.append(candidates)
+        candidates = math.ceil(candidates / HALVING_FACTOR)
+    counts = counts or [1]
+    smallest = min(MIN_SEARCH_ROWS, rows)
+    return [
+        (count, max(smallest, rows // HALVING_FACTOR ** (len(counts) - 1 - i)))
+        for i, count in enumerate(counts)
+    ]
+
+
+def score_candidate(index, algorithm, params, x, y, x_val, y_val, cores=1):
+    """Validation accuracy of one candidate, run in a worker process"""
+    model = make_model(algorithm, cores, params)
+    with threadpool_limits(cores):
+        model.fit(x, y)
+        return index, accuracy_score(y_val, model.predict(x_val))
+
+
+def hyperparameter_search(key: str, config: dict, progress=None):
+    """
+    Successive halving over the search space of the configured algorithm,
+    each round's candidates fitted at the same time in a process pool. The
+    best setting is refitted on the whole training split, scored on the test
+    split and stored, a search that already ran is read back instead.
+    `progress(done, total)` is called after every fit. Returns None when the
+    dataset is gone, raises ValueError when the sizes don't fit the data.
+    """
+    search_config = {**config, "search": "halving"}
+    result = get_trained(key, search_config)
+    if result is not None:
+        return result
+    prepared = training_split(key, config)
+    if prepared is None:
+        return None
+    split, edges = prepared
+    x_train, _, y_train, _ = split
+    x_fit, x_val, y_fit, y_val = train_test_split(
+        x_train, y_train, test_size=SEARCH_VALIDATION, random_state=42
+    )
+    algorithm = config["algorithm"]
+    candidates = list(
+        ParameterSampler(SEARCH_SPACES[algorithm], SEARCH_CANDIDATES, random_state=42)
+    )
+    rounds = halving_rounds(len(candidates), len(x_fit))
+    total = sum(count for count, _ in rounds)
+    survivors = list(range(len(candidates)))
+    history = []
+    done = 0
+    for count, rows in rounds:
+        jobs = min(count, os.cpu_count() or 1)
+        cores = max(1, (os.cpu_count() or 1) // jobs)
+        # Rows were shuffled by the split, the first ones are a random sample
+        fits = Parallel(n_jobs=jobs, return_as="generator_unordered")(
+            delayed(score_candidate)(
+                i,
+                algorithm,
+                candidates[i],
+                x_fit[:rows],
+                y_fit[:rows],
+                x_val,
+                y_val,
+                cores,
+            )
+            for i in survivors
+        )
+        scores = {}
+        for index, score in fits:
+            scores[index] = score
+            done += 1
+            if progress:
+                progress(done, total)
+        survivors.sort(key=lambda i: scores[i], reverse=True)
+        history.append(
+            {"candidates": count, "rows": rows, "bestAccuracy": scores[survivors[0]]}
+        )
+        survivors = survivors[: math.ceil(count / HALVING_FACTOR)]
+
+    best = survivors[0]
+    result = fit_model(algorithm, split, os.cpu_count() or 1, candidates[best])
+    result.update(
+        params=candidates[best],
+        validationAccuracy=scores[best],
+        rounds=history,
+        fits=total,
+        binEdges=edges,
+    )
+    return put_trained(key, search_config, result)
+
+
+def make_stream_model(algorithm: str):
+    if algorithm == "sgd":
+        return SGDClassifier(loss="log_loss", random_state=42)
+    if algorithm == "naivebayes":
+        return GaussianNB()
+    raise ValueError(f"Unknown streaming classifier: {algorithm}")
+
+
+def target_values(column):
+    """Numpy values of a target column chunk and the mask of usable rows"""
+    if pa.types.is_dictionary(column.type):
+        column = column.dictionary_decode()
+    if pa.types.is_floating(column.type):
+        values = numeric_values(column)
+        valid = ~np.isnan(values)
+        return np.where(valid, values, 0).astype(np.int64), valid
+    valid = pc.is_valid(column).to_numpy(zero_copy_only=False)
+    return column.to_numpy(zero_copy_only=False), valid
+
+
+def stream_classes(key: str, target: str):
+    """Every target value in the dataset, read one chunk of that column at a time"""
+    classes = set()
+    for batch in iter_chunks(key, [target]):
+        values, valid = target_values(batch.column(0))
+        classes.update(np.unique(values[valid]).tolist())
+    return np.array(sorted(classes))
+
+
+def stream_split(key: str, features, target: str, test_size, train_size):
+    """
+    Chunks of a stored dataset as (x, y, test, train): numeric features as
+    float64 with incomplete rows dropped, and masks of the rows held out for
+    testing and of the rows to train on. The masks come from a per chunk
+    seed, so every pass over the dataset holds out the same rows.
+    """
+    for i, batch in enumerate(
+        iter_chunks(key, list(dict.fromkeys([*features, target])))
+    ):
+        x = np.column_stack([numeric_values(batch.column(c)) for c in features])
+        y, valid = target_values(batch.column(target))
+        keep = valid & ~np.isnan(x).any(axis=1)
+        draw = np.random.default_rng([42, i]).random(batch.num_rows)[keep]
+        yield x[keep], y[keep], draw < test_size, (draw >= test_size) & (
+            draw < test_size + train_size
+        )
+
+
+def report_from_confusion(confusion: np.ndarray, classes):
+    """classification_report(output_dict=True) built from summed confusion counts"""
+    hits = np.diag(confusion).astype(float)
+    support = confusion.sum(axis=1)
+    predicted = confusion.sum(axis=0)
+    precision = np.divide(hits, predicted, out=np.zeros_like(hits), where=predicted > 0)
+    recall = np.divide(hits, support, out=np.zeros_like(hits), where=support > 0)
+    both = precision + recall
+    f1 = np.divide(
+        2 * precision * recall, both, out=np.zeros_like(hits), where=both > 0
+    )
+    report = {
+        str(label): {
+            "precision": precision[i],
+            "recall": recall[i],
+            "f1-score": f1[i],
+            "support": float(support[i]),
+        }
+        for i, label in enumerate(classes)
+    }
+    total = max(1, support.sum())
+    report["accuracy"] = hits.sum() / total
+    for name, weights in [
+        ("macro avg", np.full(len(classes), 1 / len(classes))),
+        ("weighted avg", support / total),
+    ]:
+        report[name] = {
+            "precision": float(precision @ weights),
+            "recall": float(recall @ weights),
+            "f1-score": float(f1 @ weights),
+            "support": float(support.sum()),
+        }
+    return report
+
+
+def stream_train(key: str, config: dict, algorithm: str, progress=None):
+    """
+    Train a partial_fit learner over the stored chunks, scaling features with
+    running statistics. Before each chunk is learned its test rows are scored,
+    giving a live accuracy; a second pass scores the whole test stream with
+    the final model. `progress(done, total, accuracy)` is called after every
+    chunk of either pass. Returns None when the dataset is gone, raises
+    ValueError when there is nothing to learn.
+    """
+    stream_config = {**config, "algorithm": algorithm, "stream": True}
+    result = get_trained(key, stream_config)
+    if result is not None:
+        return result
+    try:
+        numeric = {
+            col["name"] for col in dataset_schema(read_schema(key)) if col["numeric"]
+        }
+        chunks = count_chunks(key)
+    except FileNotFoundError:
+        return None
+    features = [c for c in config["features"] if c in numeric and c != config["target"]]
+    if not features:
+        raise ValueError("no numeric feature columns selected")
+    classes = stream_classes(key, config["target"])
+    if len(classes) < 2:
+        raise ValueError("the target needs at least two classes")
+
+    def split():
+        return stream_split(
+            key, features, config["target"], config["testSize"], config["trainSize"]
+        )
+
+    model = make_stream_model(algorithm)
+    scaler = StandardScaler()
+    correct = tested = trained = 0
+    history = []
+    for done, (x, y, test, train) in enumerate(split(), start=1):
+        if trained and test.any():
+            correct += int((model.predict(scaler.transform(x[test])) == y[test]).sum())
+            tested += int(test.sum())
+        if train.any():
+            scaler.partial_fit(x[train])
+            model.partial_fit(scaler.transform(x[train]), y[train], classes=classes)
+            trained += int(train.sum())
+        history.append(correct / tested if tested else None)
+        if progress:
+            progress(done, 2 * chunks, history[-1])
+    if not trained:
+        raise ValueError("no complete rows to train on")
+
+    confusion = np.zeros((len(classes), len(classes)), dtype=np.int64)
+    for done, (x, y, test, _) in enumerate(split(), start=chunks + 1):
+        if test.any():
+            confusion += confusion_matrix(
+                y[test], model.predict(scaler.transform(x[test])), labels=classes
+            )
+        if progress:
+            progress(done, 2 * chunks, history[-1])
+    report = report_from_confusion(confusion, classes)
+    return put_trained(
+        key,
+        stream_config,
+        {
+            "model": model,
+            "scaler": scaler,
+            "features": features,
+            "classes": classes,
+            "report": report,
+            "accuracy": report["accuracy"],
+            "history": history,
+            "trainRows": trained,
+            "testRows": int(confusion.sum()),
+        },
+    )
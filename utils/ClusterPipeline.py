@@ -0,0 +1,692 @@
+import os
+import json
+import hashlib
+import math
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.preprocessing import StandardScaler, MinMaxScaler
+from sklearn.cluster import DBSCAN, HDBSCAN, KMeans, MiniBatchKMeans
+from sklearn.decomposition import PCA, IncrementalPCA
+from sklearn.manifold import TSNE
+from sklearn.metrics import euclidean_distances, silhouette_score
+from sklearn.neighbors import NearestNeighbors
+from utils.DatasetStore import (
+    CHUNK_ROWS,
+    evict_lru,
+    has_dataset,
+    iter_chunks,
+    temp_path,
+)
+from utils.FrameCache import frames, is_streamed, load_profile, numeric_frame
+from utils.Streaming import numeric_values
+
+try:
+    import umap
+except ImportError:
+    umap = None
+
+# Stages of the clustering page that don't depend on the number of clusters,
+# each cached per dataset and scaling method so moving the k slider only
+# reruns the clustering itself.
+SCALERS = {"standard": StandardScaler, "minmax": MinMaxScaler}
+# Mini-batch mode: rows per partial_fit step, fewest steps before stopping,
+# and rows of the sample it is compared against full KMeans on
+BATCH_ROWS = 4096
+MIN_BATCHES = 100
+SAMPLE_ROWS = 10_000
+# Rows kept to plot and profile a dataset clustered from its stored chunks
+STREAM_SAMPLE_ROWS = 20_000
+# k sweep results live on disk, it runs in a background worker process
+SWEEP_DIR = os.path.join("./cache", "clusters")
+SWEEP_SIZE_LIMIT = int(os.environ.get("CLUSTER_CACHE_BYTES", 512 * 1024**2))
+SWEEP_KS = list(range(2, 11))
+SILHOUETTE_ROWS = 5000
+# Projection solver by matrix size: exact SVD for small matrices, randomized
+# SVD above RANDOMIZED_CELLS values, IncrementalPCA over slices of the scaled
+# matrix above INCREMENTAL_CELLS values, where the SVD's centered copy would
+# double the matrix
+RANDOMIZED_CELLS = 1_000_000
+INCREMENTAL_CELLS = 25_000_000
+# Density clustering: KD-tree up to this many columns, ball tree above, and
+# neighbors kept per row for HDBSCAN (the largest min_samples offered)
+KD_TREE_COLUMNS = 15
+MAX_NEIGHBORS = 50
+# Largest radius graph DBSCAN may build, estimated from a sample first
+MAX_GRAPH_EDGES = int(os.environ.get("RADIUS_GRAPH_EDGES", 50_000_000))
+
+# Nonlinear embeddings are fitted on a sample of rows in a background job
+EMBEDDING_ROWS = 10_000
+EMBEDDING_METHODS = ["tsne"] + (["umap"] if umap else [])
+
+os.makedirs(SWEEP_DIR, exist_ok=True)
+
+
+def scaled_data(key: str, scaling_method: str):
+    """Fitted scaler and scaled numeric matrix of a dataset"""
+    X = numeric_frame(key)
+    if X is None:
+        return None
+
+    def build():
+        # float32 halves the matrix, scaled slice by slice to skip a float64 copy
+        scaler = SCALERS.get(scaling_method, MinMaxScaler)().fit(X)
+        X_scaled = np.empty(X.shape, dtype=np.float32)
+        for start in range(0, len(X), CHUNK_ROWS):
+            X_scaled[start : start + CHUNK_ROWS] = scaler.transform(
+                X.iloc[start : start + CHUNK_ROWS]
+            )
+        return scaler, X_scaled
+
+    return frames.get_or_build((key, "scaled", scaling_method), build)
+
+
+def projection_method(rows: int, columns: int):
+    if rows * columns > INCREMENTAL_CELLS:
+        return "incremental"
+    if rows * columns > RANDOMIZED_CELLS:
+        return "randomized"
+    return "full"
+
+
+def projection(key: str, scaling_method: str):
+    """
+    2-D PCA projection of the scaled matrix, used to plot the clusters, with
+    the explained variance ratio of both components and the solver used.
+    """
+    scaled = scaled_data(key, scaling_method)
+    if scaled is None:
+        return None
+    X_scaled = scaled[1]
+
+    def build():
+        method = projection_method(*X_scaled.shape)
+        if method == "incremental":
+            # Fitted slice by slice of the cached matrix, never on one big SVD
+            pca = IncrementalPCA(n_components=2)
+            for start in range(0, len(X_scaled), CHUNK_ROWS):
+                batch = X_scaled[start : start + CHUNK_ROWS]
+                if len(batch) >= 2:
+                    pca.partial_fit(batch)
+            coordinates = np.vstack(
+                [
+                    pca.transform(X_scaled[start : start + CHUNK_ROWS])
+                    for start in range(0, len(X_scaled), CHUNK_ROWS)
+                ]
+            )
+        else:
+            pca = PCA(n_components=2, svd_solver=method, random_state=0)
+            coordinates = pca.fit_transform(X_scaled)
+        return {
+            "coordinates": coordinates,
+            "explainedVariance": pca.explained_variance_ratio_,
+            "method": method,
+        }
+
+    return frames.get_or_build((key, "pca", scaling_method), build)
+
+
+def minibatch_kmeans(key: str, scaling_method: str, n_clusters: int):
+    """
+    MiniBatchKMeans trained with partial_fit over slices of the cached scaled
+    matrix. Small datasets get several passes so the centers still settle.
+    """
+    scaled = scaled_data(key, scaling_method)
+    if scaled is None:
+        return None
+    X_scaled = scaled[1]
+
+    def build():
+        model = MiniBatchKMeans(
+            n_clusters=n_clusters, batch_size=BATCH_ROWS, random_state=42
+        )
+        passes = math.ceil(MIN_BATCHES * BATCH_ROWS / max(len(X_scaled), 1))
+        for _ in range(min(max(passes, 1), 10)):
+            for start in range(0, len(X_scaled), BATCH_ROWS):
+                model.partial_fit(X_scaled[start : start + BATCH_ROWS])
+        return model
+
+    return frames.get_or_build((key, "minibatch", scaling_method, n_clusters), build)
+
+
+def profile_scaler(key: str, scaling_method: str):
+    """
+    Numeric columns and the scaling as (X - offset) * factor, taken from the
+    column statistics of the upload profile, for datasets too large to load
+    and fit a scaler on. Constant columns keep a factor of 1 as in sklearn.
+    """
+    profile = load_profile(key)
+    if profile is None:
+        return None
+    columns = profile["numericColumns"]
+
+    def stat(name):
+        values = [profile["columns"][col].get(name) for col in columns]
+        return np.array([np.nan if v is None else v for v in values], dtype=float)
+
+    if scaling_method == "standard":
+        offset, spread = stat("mean"), stat("std")
+    else:
+        offset, spread = stat("min"), stat("max") - stat("min")
+    spread = np.where(np.isfinite(spread) & (spread > 0), spread, 1.0)
+    return columns, offset, 1 / spread
+
+
+def stream_scaled_chunks(key: str, scaling_method: str):
+    """Row positions and scaled values of the complete rows of each stored chunk"""
+    columns, offset, factor = profile_scaler(key, scaling_method)
+    start = 0
+    for batch in iter_chunks(key, columns):
+        X = np.column_stack([numeric_values(batch.column(col)) for col in columns])
+        complete = ~np.isnan(X).any(axis=1)
+        positions = start + np.flatnonzero(complete)
+        start += batch.num_rows
+        if positions.size:
+            yield positions, ((X[complete] - offset) * factor).astype(np.float32)
+
+
+def stream_minibatch_kmeans(key: str, scaling_method: str, n_clusters: int):
+    """
+    Mini-batch mode for datasets stored in chunks: partial_fit over the
+    chunks read from disk and scaled with the profile's statistics. The last
+    pass keeps a random sample of about STREAM_SAMPLE_ROWS rows, labelled,
+    projected with PCA and unscaled, which the page plots and profiles.
+    """
+    profile = load_profile(key)
+    if profile is None or not has_dataset(key):
+        return None
+    columns, offset, factor = profile_scaler(key, scaling_method)
+
+    def build():
+        model = MiniBatchKMeans(
+            n_clusters=n_clusters, batch_size=BATCH_ROWS, random_state=42
+        )
+        rows = profile["completeRows"]
+        passes = min(max(math.ceil(MIN_BATCHES * BATCH_ROWS / max(rows, 1)), 1), 10)
+        rng = np.random.default_rng(0)
+        share = STREAM_SAMPLE_ROWS / max(rows, 1)
+        positions, sample = [], []
+        for current in range(passes):
+            for chunk_rows, X_scaled in stream_scaled_chunks(key, scaling_method):
+                for start in range(0, len(X_scaled), BATCH_ROWS):
+                    model.partial_fit(X_scaled[start : start + BATCH_ROWS])
+                if current == passes - 1:
+                    keep = rng.random(len(X_scaled)) < share
+                    positions.append(chunk_rows[keep])
+                    sample.append(X_scaled[keep])
+        X_scaled = np.vstack(sample)
+        pca = PCA(n_components=2, random_state=0)
+        return {
+            "model": model,
+            "rows": rows,
+            "scaled": X_scaled,
+            "labels": model.predict(X_scaled),
+            "sample": pd.DataFrame(
+                X_scaled / factor + offset,
+                index=np.concatenate(positions),
+                columns=columns,
+            ),
+            "coordinates": pca.fit_transform(X_scaled),
+            "explainedVariance": pca.explained_variance_ratio_,
+        }
+
+    return frames.get_or_build(
+        (key, "minibatch-stream", scaling_method, n_clusters), build
+    )
+
+
+def inertia_gap(key: str, scaling_method: str, n_clusters: int):
+    """Inertia of the mini-batch model and of full KMeans on the same sample"""
+    if is_streamed(key):
+        clustered = stream_minibatch_kmeans(key, scaling_method, n_clusters)
+        if clustered is None:
+            return None
+        model, X_scaled = clustered["model"], clustered["scaled"]
+    else:
+        scaled = scaled_data(key, scaling_method)
+        model = minibatch_kmeans(key, scaling_method, n_clusters)
+        if scaled is None or model is None:
+            return None
+        X_scaled = scaled[1]
+
+    def build():
+        rng = np.random.default_rng(0)
+        rows = min(SAMPLE_ROWS, len(X_scaled))
+        sample = X_scaled[rng.choice(len(X_scaled), rows, replace=False)]
+        full = KMeans(n_clusters=n_clusters, random_state=42).fit(sample)
+        return {
+            "sampleRows": rows,
+            "fullInertia": float(full.inertia_),
+            "minibatchInertia": float(-model.score(sample)),
+        }
+
+    return frames.get_or_build((key, "inertia-gap", scaling_method, n_clusters), build)
+
+
+def sweep_path(key: str, scaling_method: str, k=None):
+    name = f"{key}-{scaling_method}"
+    if k is None:
+        return os.path.join(SWEEP_DIR, f"{name}.json")
+    return os.path.join(SWEEP_DIR, f"{name}-{k}.npz")
+
+
+def warm_starts(X: np.ndarray, ks):
+    """
+    Initial centers for every k, fitted one after the other on a sample:
+    each k starts from the centers of k - 1 plus the sample point farthest
+    from all of them, found with the |x|^2 - 2 x.c + |c|^2 product of
+    euclidean_distances instead of a sample x centers x columns difference.
+    """
+    rng = np.random.default_rng(0)
+    sample = X[rng.choice(len(X), min(SAMPLE_ROWS, len(X)), replace=False)]
+    centers = KMeans(n_clusters=ks[0], random_state=42).fit(sample).cluster_centers_
+    inits = {ks[0]: centers}
+    for k in ks[1:]:
+        distances = euclidean_distances(sample, centers, squared=True)
+        init = np.vstack([centers, sample[distances.min(axis=1).argmax()]])
+        centers = KMeans(n_clusters=k, init=init, n_init=1).fit(sample).cluster_centers_
+        inits[k] = centers
+    return inits
+
+
+def fit_k(X: np.ndarray, init: np.ndarray):
+    """One k of the sweep, run in a worker process"""
+    model = KMeans(n_clusters=len(init), init=init, n_init=1).fit(X)
+    silhouette = silhouette_score(
+        X,
+        model.labels_,
+        sample_size=min(SILHOUETTE_ROWS, len(X)),
+        random_state=0,
+    )
+    return len(init), model.labels_, model.cluster_centers_, model.inertia_, silhouette
+
+
+def k_sweep(key: str, scaling_method: str, progress=None):
+    """
+    Fit every k of the slider in parallel worker processes and store the
+    labels per k on disk. Returns inertia and sampled silhouette per k;
+    a sweep that was already run is read back instead.
+    """
+    summary_path = sweep_path(key, scaling_method)
+    if os.path.exists(summary_path) and all(
+        os.path.exists(sweep_path(key, scaling_method, k)) for k in SWEEP_KS
+    ):
+        with open(summary_path) as f:
+            return json.load(f)
+    scaled = scaled_data(key, scaling_method)
+    if scaled is None:
+        return None
+    X = scaled[1]
+    ks = [k for k in SWEEP_KS if k < len(X)]
+    if not ks:
+        return None
+    inits = warm_starts(X, ks)
+    results = {}
+    jobs = Parallel(
+        n_jobs=min(len(ks), os.cpu_count() or 1), return_as="generator_unordered"
+    )(delayed(fit_k)(X, inits[k]) for k in ks)
+    for k, labels, centers, inertia, silhouette in jobs:
+        path = sweep_path(key, scaling_method, k)
+        tmp_path = temp_path(path)
+        with open(tmp_path, "wb") as f:
+            np.savez(f, labels=labels.astype(np.int8), centers=centers)
+        os.replace(tmp_path, path)
+        results[k] = (float(inertia), float(silhouette))
+        if progress:
+            progress(len(results), len(ks))
+    summary = {
+        "datasetId": key,
+        "scaling": scaling_method,
+        "ks": ks,
+        "inertia": [results[k][0] for k in ks],
+        "silhouette": [results[k][1] for k in ks],
+    }
+    tmp_path = temp_path(summary_path)
+    with open(tmp_path, "w") as f:
+        json.dump(summary, f)
+    os.replace(tmp_path, summary_path)
+    evict_lru(SWEEP_DIR, ".npz", SWEEP_SIZE_LIMIT)
+    return summary
+
+
+def sweep_result(key: str, scaling_method: str, k: int):
+    """Labels and centers of k from a finished sweep, None when not computed"""
+    try:
+        with np.load(sweep_path(key, scaling_method, k)) as saved:
+            return saved["labels"], saved["centers"]
+    except (FileNotFoundError, OSError):
+        return None
+
+
+def model_path(key: str, scaling_method: str, k: int):
+    return os.path.join(SWEEP_DIR, f"{key}-{scaling_method}-{k}-model.npz")
+
+
+def scaler_transform(scaler):
+    """The fitted scaling as (X - offset) * factor, applied with numpy alone"""
+    if isinstance(scaler, StandardScaler):
+        return scaler.mean_, 1 / scaler.scale_
+    return -scaler.min_ / scaler.scale_, scaler.scale_
+
+
+def save_model(key: str, scaling_method: str, centers: np.ndarray, columns):
+    """
+    Persist the scaler and centroids of the last k-means shown for this
+    dataset, scaler and k, so new rows can be assigned without re-clustering.
+    Rendering the same clustering again doesn't rewrite the file.
+    """
+    if is_streamed(key):
+        offset, factor = profile_scaler(key, scaling_method)[1:]
+    else:
+        scaled = scaled_data(key, scaling_method)
+        if scaled is None:
+            return None
+        offset, factor = scaler_transform(scaled[0])
+    path = model_path(key, scaling_method, len(centers))
+    saved_key = (key, "saved-centers", scaling_method, len(centers))
+    saved = frames.get(saved_key)
+    if saved is not None and np.array_equal(saved, centers) and os.path.exists(path):
+        return path
+    tmp_path = temp_path(path)
+    with open(tmp_path, "wb") as f:
+        np.savez(
+            f,
+            columns=np.asarray([str(col) for col in columns]),
+            offset=offset,
+            factor=factor,
+            centers=centers,
+        )
+    os.replace(tmp_path, path)
+    evict_lru(SWEEP_DIR, ".npz", SWEEP_SIZE_LIMIT, keep=path)
+    frames.put(saved_key, np.array(centers))
+    return path
+
+
+def load_model(key: str, scaling_method: str, k: int):
+    try:
+        with np.load(model_path(key, scaling_method, k)) as saved:
+            return {name: saved[name] for name in saved.files}
+    except (FileNotFoundError, OSError):
+        return None
+
+
+def assign_clusters(model, X: np.ndarray):
+    """
+    Nearest centroid of every row with one matrix product,
+    |x - c|^2 = |x|^2 - 2 x.c + |c|^2. Rows with missing values get -1.
+    """
+    scaled = (X - model["offset"]) * model["factor"]
+    centers = model["centers"]
+    squared = (
+        np.einsum("ij,ij->i", scaled, scaled)[:, None]
+        - 2 * scaled @ centers.T
+        + np.einsum("ij,ij->i", centers, centers)[None, :]
+    )
+    missing = np.isnan(scaled).any(axis=1)
+    squared[missing] = 0
+    labels = squared.argmin(axis=1)
+    distances = np.sqrt(np.maximum(squared[np.arange(len(labels)), labels], 0))
+    labels[missing] = -1
+    distances[missing] = np.nan
+    return labels, distances
+
+
+def tree_algorithm(X: np.ndarray):
+    return "kd_tree" if X.shape[1] <= KD_TREE_COLUMNS else "ball_tree"
+
+
+def neighbor_index(key: str, scaling_method: str):
+    """
+    Spatial index of the scaled matrix, built once per dataset and scaler
+    and queried on every core.
+    """
+    scaled = scaled_data(key, scaling_method)
+    if scaled is None:
+        return None
+    X_scaled = scaled[1]
+
+    def build():
+        return NearestNeighbors(algorithm=tree_algorithm(X_scaled), n_jobs=-1).fit(
+            X_scaled
+        )
+
+    return frames.get_or_build((key, "neighbors", scaling_method), build)
+
+
+def dbscan_labels(key: str, scaling_method: str, eps: float, min_samples: int):
+    """
+    DBSCAN over a radius neighbors graph queried from the cached index. The
+    graph of the last eps is kept, so changing min_samples only relabels it.
+    """
+    index = neighbor_index(key, scaling_method)
+    if index is None:
+        return None
+    X_scaled = scaled_data(key, scaling_method)[1]
+
+    def radius_graph():
+        rng = np.random.default_rng(0)
+        sample = X_scaled[rng.choice(len(X_scaled), min(1000, len(X_scaled)))]
+        neighbors = index.radius_neighbors(sample, radius=eps, return_distance=False)
+        per_row = np.mean([len(found) for found in neighbors])
+        if per_row * len(X_scaled) > MAX_GRAPH_EDGES:
+            raise ValueError(
+                f"eps={eps} gives about {per_row:.0f} neighbors per row, "
+                "too many to cluster in memory, try a smaller eps"
+            )
+        return index.radius_neighbors_graph(radius=eps, mode="distance")
+
+    # One graph per dataset and scaler, the previous eps is dropped before the
+    # next one is built so moving the slider never holds several of them
+    graph_key = (key, "radius-graph", scaling_method)
+    cached = frames.get(graph_key)
+    if cached is not None and cached[0] == eps:
+        graph = cached[1]
+    else:
+        frames.discard(graph_key)
+        graph = frames.put(graph_key, (eps, radius_graph()))[1]
+    return frames.get_or_build(
+        (key, "dbscan", scaling_method, eps, min_samples),
+        lambda: DBSCAN(
+            eps=eps, min_samples=min_samples, metric="precomputed"
+        ).fit_predict(graph),
+    )
+
+
+def hdbscan_labels(key: str, scaling_method: str, min_samples: int):
+    """
+    HDBSCAN over the symmetric k nearest neighbors graph of the cached index.
+    HDBSCAN needs that graph connected, otherwise it builds its own tree.
+    """
+    index = neighbor_index(key, scaling_method)
+    if index is None:
+        return None
+    X_scaled = scaled_data(key, scaling_method)[1]
+
+    def knn_graph():
+        n_neighbors = min(MAX_NEIGHBORS, len(X_scaled) - 1)
+        graph = index.kneighbors_graph(n_neighbors=n_neighbors, mode="distance")
+        return graph.maximum(graph.T).tocsr()
+
+    def build():
+        graph = frames.get_or_build((key, "knn-graph", scaling_method), knn_graph)
+        try:
+            # copy so the cached graph is not modified in place
+            return HDBSCAN(
+                min_samples=min_samples, metric="precomputed", copy=True
+            ).fit_predict(graph)
+        except ValueError as e:
+            print("Neighbors graph not usable for HDBSCAN", e)
+            return HDBSCAN(
+                min_samples=min_samples,
+                algorithm=tree_algorithm(X_scaled),
+                n_jobs=-1,
+                copy=True,
+            ).fit_predict(X_scaled)
+
+    return frames.get_or_build((key, "hdbscan", scaling_method, min_samples), build)
+
+
+def clustering_labels(key: str, scaling_method: str, mode: str, parameters):
+    """
+    Labels and centers (None for density clustering) of one clustering of the
+    page. `parameters` are (eps, min_samples) for DBSCAN, (min_samples,) for
+    HDBSCAN and (k,) for the k-means modes.
+    """
+    X_scaled = scaled_data(key, scaling_method)[1]
+    if mode == "dbscan":
+        return dbscan_labels(key, scaling_method, *parameters), None
+    if mode == "hdbscan":
+        return hdbscan_labels(key, scaling_method, *parameters), None
+    (n_clusters,) = parameters
+    if mode == "minibatch":
+        model = minibatch_kmeans(key, scaling_method, n_clusters)
+        return model.predict(X_scaled), model.cluster_centers_
+    # Labels from the background k sweep when it has reached this k
+    sweep = sweep_result(key, scaling_method, n_clusters)
+    if sweep is not None and len(sweep[0]) == len(X_scaled):
+        return sweep
+    kmeans = KMeans(n_clusters=n_clusters, random_state=42).fit(X_scaled)
+    return kmeans.labels_, kmeans.cluster_centers_
+
+
+def cluster_profile_table(
+    key: str, scaling_method: str, mode: str, parameters, labels=None
+):
+    """
+    Cluster profile of one clustering, cached per worker with a hash of the
+    labels it was built from, so labels that change for the same settings
+    (k-means before and after the k sweep) replace it. A worker that didn't
+    render the clustering rebuilds it from the labels.
+    """
+    profile_key = (key, "cluster-profile", scaling_method, mode, *parameters)
+    cached = frames.get(profile_key)
+    if labels is None and cached is not None:
+        return cached[1]
+    if is_streamed(key):
+        # Only mini-batch runs on these, profiled on the sample it kept
+        clustered = None
+        if mode == "minibatch":
+            clustered = stream_minibatch_kmeans(key, scaling_method, *parameters)
+        if clustered is None:
+            return None
+        X, X_scaled = clustered["sample"], clustered["scaled"]
+        labels = clustered["labels"]
+    else:
+        scaled = scaled_data(key, scaling_method)
+        if scaled is None:
+            return None
+        X, X_scaled = numeric_frame(key), scaled[1]
+        if labels is None:
+            labels = clustering_labels(key, scaling_method, mode, parameters)[0]
+    digest = hashlib.sha1(np.ascontiguousarray(labels).tobytes()).hexdigest()
+    if cached is None or cached[0] != digest:
+        profile = cluster_profile(labels, X, X_scaled)
+        cached = frames.put(profile_key, (digest, profile))
+    return cached[1]
+
+
+def grouped_sums(groups: np.ndarray, k: int, values: np.ndarray):
+    """Per group column sums of a matrix with one bincount over every cell"""
+    d = values.shape[1]
+    cells = groups[:, None] * d + np.arange(d)
+    return np.bincount(cells.ravel(), weights=values.ravel(), minlength=k * d).reshape(
+        k, d
+    )
+
+
+def cluster_profile(labels: np.ndarray, X, X_scaled: np.ndarray):
+    """
+    One row per cluster: size, share, per feature centroid (mean) and std in
+    data units, and quantiles of the distance to the centroid in scaled
+    space. Everything comes from grouped reductions and one sort, not a
+    pass per cluster.
+    """
+    clusters, groups, sizes = np.unique(labels, return_inverse=True, return_counts=True)
+    k = len(clusters)
+    values = X.to_numpy(dtype=np.float64)
+    means = grouped_sums(groups, k, values) / sizes[:, None]
+    deviations = grouped_sums(groups, k, np.square(values - means[groups]))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        stds = np.sqrt(deviations / (sizes[:, None] - 1))
+    centroids = grouped_sums(groups, k, X_scaled) / sizes[:, None]
+    distances = np.sqrt(np.square(X_scaled - centroids[groups]).sum(axis=1))
+
+    # Sorted by cluster then distance, each quantile is an offset into a group
+    ordered = distances[np.lexsort((distances, groups))]
+    starts = np.r_[0, np.cumsum(sizes)[:-1]]
+    quantiles = {
+        name: ordered[starts + np.floor(q * (sizes - 1)).astype(int)]
+        for name, q in [("p25", 0.25), ("p50", 0.5), ("p90", 0.9)]
+    }
+
+    records = []
+    for i, cluster in enumerate(clusters):
+        record = {
+            "Cluster": "Noise" if cluster < 0 else int(cluster),
+            "Size": int(sizes[i]),
+            "Share": f"{sizes[i] / len(labels):.1%}",
+        }
+        for name, values in quantiles.items():
+            record[f"Distance {name}"] = round(float(values[i]), 4)
+        for j, col in enumerate(X.columns):
+            record[f"{col} centroid"] = round(float(means[i, j]), 4)
+            record[f"{col} std"] = (
+                None if np.isnan(stds[i, j]) else round(float(stds[i, j]), 4)
+            )
+        records.append(record)
+    return records
+
+
+def embedding_path(key: str, scaling_method: str, method: str, perplexity: int):
+    return os.path.join(
+        SWEEP_DIR, f"{key}-{scaling_method}-{method}-{perplexity}-embedding.npz"
+    )
+
+
+def compute_embedding(
+    key: str, scaling_method: str, method: str, perplexity: int, progress=None
+):
+    """
+    2-D t-SNE (or UMAP when installed) of a sample of the scaled rows, saved
+    on disk with the sampled row positions. `perplexity` is the UMAP
+    neighbor count. Returns the path, an existing embedding is not refitted.
+    """
+    path = embedding_path(key, scaling_method, method, perplexity)
+    if os.path.exists(path):
+        return path
+    scaled = scaled_data(key, scaling_method)
+    if scaled is None:
+        return None
+    X_scaled = scaled[1]
+    if progress:
+        progress(1, 3)
+    rng = np.random.default_rng(0)
+    rows = np.sort(
+        rng.choice(len(X_scaled), min(EMBEDDING_ROWS, len(X_scaled)), replace=False)
+    )
+    sample = X_scaled[rows]
+    neighbors = max(2, min(perplexity, (len(sample) - 1) // 3))
+    if method == "umap" and umap:
+        model = umap.UMAP(n_neighbors=neighbors, random_state=0)
+    else:
+        model = TSNE(perplexity=neighbors, init="pca", random_state=0, n_jobs=-1)
+    if progress:
+        progress(2, 3)
+    coordinates = model.fit_transform(sample)
+    tmp_path = temp_path(path)
+    with open(tmp_path, "wb") as f:
+        np.savez(f, rows=rows, coordinates=coordinates)
+    os.replace(tmp_path, path)
+    evict_lru(SWEEP_DIR, ".npz", SWEEP_SIZE_LIMIT, keep=path)
+    if progress:
+        progress(3, 3)
+    return path
+
+
+def load_embedding(key: str, scaling_method: str, method: str, perplexity: int):
+    """Sampled row positions and their 2-D coordinates, None when not computed"""
+    try:
+        with np.load(embedding_path(key, scaling_method, method, perplexity)) as saved:
+            return saved["rows"], saved["coordinates"]
+    except (FileNotFoundError, OSError):
+        return None
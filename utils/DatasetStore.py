@@ -0,0 +1,199 @@
+import os
+import json
+import hashlib
+import tempfile
+import threading
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+# Uploaded datasets are kept on the server, the browser only holds the id.
+# Each dataset is an uncompressed Arrow IPC file so reads are memory mapped
+# and only touch the columns that are asked for.
+DATASET_DIR = os.path.join("./cache", "datasets")
+DATASET_SIZE_LIMIT = int(os.environ.get("DATASET_CACHE_BYTES", 2 * 1024**3))
+CHUNK_ROWS = 64 * 1024
+
+os.makedirs(DATASET_DIR, exist_ok=True)
+_write_lock = threading.Lock()
+
+
+def file_dataset_id(path: str):
+    """Content hash of an uploaded file, the same bytes always get the same id"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()[:32]
+
+
+def dataset_path(key: str):
+    return os.path.join(DATASET_DIR, f"{key}.arrow")
+
+
+def read_schema(key: str):
+    """Arrow schema of a stored dataset, read from the file footer only"""
+    with pa.memory_map(dataset_path(key)) as source:
+        return pa.ipc.open_file(source).schema
+
+
+def dataset_info(schema: pa.Schema):
+    """Ingestion details saved with the dataset, e.g. the memory report"""
+    metadata = schema.metadata or {}
+    return json.loads(metadata.get(b"dataset", b"{}"))
+
+
+def dataset_schema(schema: pa.Schema):
+    dtypes = schema.empty_table().to_pandas().dtypes
+    return [
+        {
+            "name": str(col),
+            "dtype": str(dtype),
+            "numeric": bool(pd.api.types.is_numeric_dtype(dtype))
+            and not pd.api.types.is_bool_dtype(dtype),
+        }
+        for col, dtype in dtypes.items()
+    ]
+
+
+def dataset_meta(key: str, filename: str):
+    """Small payload stored in the browser instead of the records"""
+    schema = read_schema(key)
+    return {
+        "fileName": filename,
+        "datasetId": key,
+        "schema": dataset_schema(schema),
+        "memory": dataset_info(schema).get("memory"),
+    }
+
+
+def put_table(key: str, table: pa.Table, info=None):
+    if info:
+        metadata = dict(table.schema.metadata or {})
+        metadata[b"dataset"] = json.dumps(info).encode("utf-8")
+        table = table.replace_schema_metadata(metadata)
+    path = dataset_path(key)
+    # Write next to the target and rename so readers never see a partial file
+    tmp_path = temp_path(path)
+    feather.write_feather(
+        table, tmp_path, compression="uncompressed", chunksize=CHUNK_ROWS
+    )
+    return commit_dataset(tmp_path, path, key)
+
+
+def put_batches(key: str, schema: pa.Schema, batches, info=None):
+    """
+    Store a dataset from an iterable of record batches without holding it
+    in memory, for files larger than the worker can load at once.
+    """
+    if info:
+        metadata = dict(schema.metadata or {})
+        metadata[b"dataset"] = json.dumps(info).encode("utf-8")
+        schema = schema.with_metadata(metadata)
+    path = dataset_path(key)
+    tmp_path = temp_path(path)
+    try:
+        with pa.ipc.new_file(tmp_path, schema) as writer:
+            for batch in batches:
+                writer.write_table(
+                    pa.Table.from_batches([batch], schema), max_chunksize=CHUNK_ROWS
+                )
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return commit_dataset(tmp_path, path, key)
+
+
+def temp_path(path: str):
+    """
+    New empty file in the directory of `path`, to write into and then rename
+    over `path`. Unique across threads and processes.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    os.close(fd)
+    return tmp_path
+
+
+def commit_dataset(tmp_path: str, path: str, key: str):
+    with _write_lock:
+        os.replace(tmp_path, path)
+        evict_lru(DATASET_DIR, ".arrow", DATASET_SIZE_LIMIT, keep=path)
+    return key
+
+
+def evict_lru(directory: str, suffix, limit: int, keep=None):
+    """Drop the least recently used files until the directory fits its limit"""
+    entries = []
+    for entry in os.scandir(directory):
+        if entry.is_file() and entry.name.endswith(suffix):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= limit:
+            break
+        if keep and os.path.samefile(path, keep):
+            continue
+        try:
+            os.remove(path)
+            total -= size
+        except OSError as e:
+            print("Error evicting", path, e)
+
+
+def has_dataset(key: str):
+    return bool(key) and os.path.exists(dataset_path(key))
+
+
+def read_table(key: str, columns=None):
+    """
+    Memory mapped Arrow table of a stored dataset, optionally only some columns.
+    Returns None when it was never stored or got evicted.
+    """
+    if not has_dataset(key):
+        return None
+    path = dataset_path(key)
+    try:
+        os.utime(path)  # mark as recently used for eviction
+        return feather.read_table(path, columns=columns, memory_map=True)
+    except FileNotFoundError:
+        return None
+
+
+def iter_chunks(key: str, columns=None):
+    """
+    Record batches of a stored dataset one at a time, at most CHUNK_ROWS rows
+    each, straight from the memory map so only the current chunk is paged in.
+    Yields nothing when the dataset was never stored or got evicted.
+    """
+    if not has_dataset(key):
+        return
+    path = dataset_path(key)
+    try:
+        os.utime(path)
+        source = pa.memory_map(path)
+    except FileNotFoundError:
+        return
+    with source:
+        reader = pa.ipc.open_file(source)
+        for i in range(reader.num_record_batches):
+            batch = reader.get_batch(i)
+            yield batch.select(columns) if columns is not None else batch
+
+
+def count_chunks(key: str):
+    with pa.memory_map(dataset_path(key)) as source:
+        return pa.ipc.open_file(source).num_record_batches
+
+
+def get_dataset(key: str, columns=None):
+    table = read_table(key, columns)
+    if table is None:
+        return None
+    return table.to_pandas()
+
+
+def schema_columns(file, numeric=False):
+    if not file or not file.get("schema"):
+        return []
+    return [col["name"] for col in file["schema"] if col["numeric"] or not numeric]
@@ -0,0 +1,91 @@
+import os
+import numpy as np
+
+# Most points a chart sends to the browser, longer series are bucketed
+POINT_BUDGET = int(os.environ.get("CHART_POINT_BUDGET", 2000))
+METHOD = os.environ.get("CHART_DOWNSAMPLING", "minmax")
+# Most markers a scatter plot sends, sampled per cluster beyond that
+SCATTER_BUDGET = int(os.environ.get("CHART_SCATTER_BUDGET", 20000))
+
+
+def min_max_indices(y: np.ndarray, budget: int):
+    """
+    Positions of the smallest and largest value of each of budget / 2 equal
+    buckets, so every spike survives. NaN is never picked over a number.
+    """
+    n = y.size
+    if n <= budget:
+        return np.arange(n)
+    buckets = max(1, budget // 2)
+    starts = np.arange(buckets) * n // buckets
+    sizes = np.diff(np.r_[starts, n])
+    missing = np.isnan(y)
+    picks = []
+    for values, reduce in [
+        (np.where(missing, np.inf, y), np.minimum),
+        (np.where(missing, -np.inf, y), np.maximum),
+    ]:
+        # First position in each bucket holding the bucket's extreme
+        hits = np.flatnonzero(
+            values == np.repeat(reduce.reduceat(values, starts), sizes)
+        )
+        picks.append(hits[np.searchsorted(hits, starts)])
+    return np.unique(np.concatenate(picks))
+
+
+def lttb_indices(y: np.ndarray, budget: int):
+    """
+    Largest Triangle Three Buckets (Steinarsson): keeps the first and last
+    point and from each bucket in between the point forming the largest
+    triangle with the previous pick and the average of the next bucket.
+    """
+    n = y.size
+    if n <= budget or budget < 3:
+        return np.arange(n)
+    y = np.where(np.isnan(y), 0.0, y)
+    edges = np.linspace(1, n - 1, budget - 1).astype(int)
+    keep = np.empty(budget, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    picked = 0
+    for i in range(budget - 2):
+        start, stop = edges[i], edges[i + 1]
+        after = edges[i + 2] if i + 2 < edges.size else n
+        next_x = (stop + after - 1) / 2
+        next_y = y[stop:after].mean()
+        xs = np.arange(start, stop)
+        area = np.abs(
+            (picked - next_x) * (y[start:stop] - y[picked])
+            - (picked - xs) * (next_y - y[picked])
+        )
+        picked = start + int(area.argmax())
+        keep[i + 1] = picked
+    return keep
+
+
+def downsample(y: np.ndarray, budget=POINT_BUDGET, method=METHOD):
+    """Positions of at most `budget` points that keep the shape of the series"""
+    if method == "lttb":
+        return lttb_indices(y, budget)
+    return min_max_indices(y, budget)
+
+
+def stratified_indices(groups: np.ndarray, budget: int, min_per_group=100, seed=0):
+    """
+    Positions of about `budget` points sampled at random within each group,
+    in proportion to the group size, but keeping at least `min_per_group`
+    points of every group so small clusters stay visible.
+    """
+    n = groups.size
+    if n <= budget:
+        return np.arange(n)
+    rng = np.random.default_rng(seed)
+    _, inverse, counts = np.unique(groups, return_inverse=True, return_counts=True)
+    quota = np.maximum(
+        np.minimum(counts, min_per_group), np.floor(counts * budget / n).astype(int)
+    )
+    # Shuffle, then rank every point within its group and keep the first quota
+    shuffled = rng.permutation(n)
+    order = shuffled[np.argsort(inverse[shuffled], kind="stable")]
+    starts = np.r_[0, np.cumsum(counts)[:-1]]
+    ranks = np.arange(n) - np.repeat(starts, counts)
+    return np.sort(order[ranks < np.repeat(quota, counts)])
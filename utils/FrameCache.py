@@ -0,0 +1,192 @@
+import os
+import sys
+import pickle
+import threading
+from collections import OrderedDict
+from utils.DatasetStore import dataset_info, get_dataset, has_dataset, read_schema
+from utils.Profile import profile_frame
+
+
+def default_cache_bytes():
+    """A quarter of the physical memory, at least 512MB"""
+    try:
+        memory = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (AttributeError, ValueError, OSError):
+        memory = 0
+    return max(512 * 1024**2, memory // 4)
+
+
+FRAME_CACHE_BYTES = int(os.environ.get("FRAME_CACHE_BYTES", default_cache_bytes()))
+
+
+class _ByteCounter:
+    """File-like sink that only counts what pickle writes to it"""
+
+    def __init__(self):
+        self.size = 0
+
+    def write(self, data):
+        self.size += memoryview(data).nbytes
+
+
+def pickled_size(value):
+    """Size of the pickled value, close to the memory of fitted estimators"""
+    counter = _ByteCounter()
+    try:
+        pickle.dump(value, counter, protocol=pickle.HIGHEST_PROTOCOL)
+    except Exception:
+        return sys.getsizeof(value)
+    return counter.size
+
+
+def nbytes(value):
+    """Rough in-memory size of a cached value"""
+    if hasattr(value, "memory_usage"):
+        # deep counts the python strings behind object columns, not the pointers
+        usage = value.memory_usage(index=True, deep=True)
+        return int(usage.sum() if hasattr(usage, "sum") else usage)
+    if all(hasattr(value, name) for name in ("data", "indices", "indptr")):
+        # scipy sparse matrices, e.g. the neighbor graphs
+        return int(value.data.nbytes + value.indices.nbytes + value.indptr.nbytes)
+    if hasattr(value, "nbytes"):
+        return int(value.nbytes)
+    if isinstance(value, (tuple, list)):
+        return sum(nbytes(item) for item in value)
+    if isinstance(value, dict):
+        return sum(nbytes(item) for item in value.values())
+    if value is None or isinstance(value, (bool, int, float, complex, str, bytes)):
+        return sys.getsizeof(value)
+    # Fitted estimators, neighbor trees: count the arrays they hold
+    return pickled_size(value)
+
+
+class FrameCache:
+    """
+    Byte bounded LRU of frames and derived values kept in worker memory.
+    Concurrent callbacks asking for the same key wait for a single build.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._items = OrderedDict()
+        self._building = {}
+        self._lock = threading.Lock()
+
+    def _lookup(self, key):
+        if key in self._items:
+            self._items.move_to_end(key)
+            return True, self._items[key][0]
+        return False, None
+
+    def get(self, key):
+        with self._lock:
+            return self._lookup(key)[1]
+
+    def put(self, key, value, size=None):
+        """Cache a value, `size` overrides the estimate when it is known"""
+        size = nbytes(value) if size is None else size
+        with self._lock:
+            if key in self._items:
+                self.size -= self._items.pop(key)[1]
+            if size > self.max_bytes:
+                return value
+            self._items[key] = (value, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, evicted) = self._items.popitem(last=False)
+                self.size -= evicted
+        return value
+
+    def discard(self, key):
+        with self._lock:
+            if key in self._items:
+                self.size -= self._items.pop(key)[1]
+
+    def get_or_build(self, key, build):
+        with self._lock:
+            found, value = self._lookup(key)
+            if found:
+                return value
+            key_lock = self._building.setdefault(key, threading.Lock())
+        with key_lock:
+            with self._lock:
+                found, value = self._lookup(key)
+            try:
+                if not found:
+                    value = build()
+                    if value is not None:
+                        self.put(key, value)
+            finally:
+                with self._lock:
+                    self._building.pop(key, None)
+        return value
+
+
+frames = FrameCache(FRAME_CACHE_BYTES)
+
+
+def load_frame(key: str):
+    """
+    Frame of a stored dataset, built once per process.
+    The same object is shared by every callback so treat it as read only.
+    """
+    if not key:
+        return None
+    return frames.get_or_build((key, "frame"), lambda: get_dataset(key))
+
+
+def load_columns(key: str, columns):
+    """
+    Only the given columns of a dataset. Sliced from the cached frame when it
+    is already built, otherwise read straight from the memory mapped file.
+    """
+    if not key:
+        return None
+    df = frames.get((key, "frame"))
+    if df is not None:
+        return df[list(columns)]
+    return frames.get_or_build(
+        (key, "columns", tuple(columns)), lambda: get_dataset(key, list(columns))
+    )
+
+
+def derived(key: str, name, build):
+    """Memoize a value computed from the dataset frame, e.g. a filtered view"""
+    df = load_frame(key)
+    if df is None:
+        return None
+    return frames.get_or_build((key, name), lambda: build(df))
+
+
+def numeric_frame(key: str):
+    """Numeric columns with incomplete rows dropped"""
+    return derived(
+        key, "numeric", lambda df: df.select_dtypes(include="number").dropna()
+    )
+
+
+def load_profile(key: str):
+    """
+    Profile computed at upload and saved in the dataset file. Datasets stored
+    before profiling existed are profiled once here instead.
+    """
+
+    def build():
+        if not has_dataset(key):
+            return None
+        profile = dataset_info(read_schema(key)).get("profile")
+        if profile is None:
+            df = load_frame(key)
+            profile = profile_frame(df) if df is not None else None
+        return profile
+
+    if not key:
+        return None
+    return frames.get_or_build((key, "profile"), build)
+
+
+def is_streamed(key: str):
+    """Datasets ingested block by block are too large to load as one frame"""
+    profile = load_profile(key)
+    return bool(profile and profile.get("streamed"))
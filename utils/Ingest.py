@@ -0,0 +1,328 @@
+import io
+import os
+import re
+import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.compute as pc
+from utils.DatasetStore import put_batches, put_table
+from utils.Profile import profile_frame
+from utils.Streaming import ColumnAggregate, numeric_values
+
+# Strings with few distinct values are stored as categories
+CATEGORY_MAX_LEVELS = 1000
+CATEGORY_MAX_RATIO = 0.5
+# Larger CSVs are parsed and stored block by block instead of all at once
+STREAM_INGEST_BYTES = int(os.environ.get("STREAM_INGEST_BYTES", 256 * 1024**2))
+CSV_BLOCK_BYTES = 16 * 1024**2
+
+INTEGER_TYPES = [
+    (pa.uint8(), np.iinfo(np.uint8)),
+    (pa.int8(), np.iinfo(np.int8)),
+    (pa.uint16(), np.iinfo(np.uint16)),
+    (pa.int16(), np.iinfo(np.int16)),
+    (pa.uint32(), np.iinfo(np.uint32)),
+    (pa.int32(), np.iinfo(np.int32)),
+]
+
+
+def integer_type(low, high):
+    for arrow_type, info in INTEGER_TYPES:
+        if info.min <= low and high <= info.max:
+            return arrow_type
+    return None
+
+
+def fits_float32(values: np.ndarray):
+    """True when float32 holds every value exactly, NaN included"""
+    with np.errstate(over="ignore"):
+        single = values.astype(np.float32).astype(np.float64)
+    return bool(np.array_equal(single, values, equal_nan=True))
+
+
+def compact_integer(column: pa.ChunkedArray):
+    bounds = pc.min_max(column)
+    low, high = bounds["min"].as_py(), bounds["max"].as_py()
+    if low is None:
+        return column
+    arrow_type = integer_type(low, high)
+    return column.cast(arrow_type) if arrow_type else column
+
+
+def compact_float(column: pa.ChunkedArray):
+    values = column.to_numpy()
+    if not fits_float32(values):
+        return column
+    return pa.chunked_array([pa.array(values.astype(np.float32), from_pandas=True)])
+
+
+def compact_string(column: pa.ChunkedArray):
+    levels = pc.count_distinct(column).as_py()
+    if levels <= CATEGORY_MAX_LEVELS and levels <= CATEGORY_MAX_RATIO * len(column):
+        return column.dictionary_encode()
+    return column
+
+
+def compact_column(column: pa.ChunkedArray):
+    """Smallest type that holds the parsed column without losing information"""
+    if pa.types.is_integer(column.type):
+        return compact_integer(column)
+    if pa.types.is_floating(column.type) and column.type != pa.float32():
+        return compact_float(column)
+    if pa.types.is_string(column.type) or pa.types.is_large_string(column.type):
+        return compact_string(column)
+    return column
+
+
+def read_csv_compact(source):
+    """
+    Parse a CSV with the multi-threaded Arrow reader and downcast every column,
+    e.g. pixel columns end up as uint8 instead of int64.
+    Returns the compact table and a memory report of the parsed and stored sizes.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    # Empty fields are missing values, as pandas read them, not "" strings
+    table = pacsv.read_csv(
+        source,
+        read_options=pacsv.ReadOptions(use_threads=True),
+        convert_options=pacsv.ConvertOptions(strings_can_be_null=True),
+    )
+    compact = pa.table(
+        [compact_column(column) for column in table.columns],
+        names=table.column_names,
+    )
+    report = {"parsedBytes": table.nbytes, "storedBytes": compact.nbytes}
+    return compact, report
+
+
+class ColumnScan:
+    """What the first pass of a streamed ingest learns about one column"""
+
+    def __init__(self, field: pa.Field, profile: bool):
+        self.type = field.type
+        self.numeric = pa.types.is_integer(self.type) or pa.types.is_floating(self.type)
+        self.nulls = 0
+        self.bytes = 0
+        self.low = self.high = None
+        self.single = self.type != pa.float32()
+        self.levels = {}  # value counts, None once there are too many levels
+        self.aggregate = ColumnAggregate() if profile and self.numeric else None
+
+    def update(self, column: pa.Array):
+        self.nulls += column.null_count
+        self.bytes += column.nbytes
+        if pa.types.is_integer(self.type):
+            bounds = pc.min_max(column)
+            low, high = bounds["min"].as_py(), bounds["max"].as_py()
+            if low is not None:
+                self.low = low if self.low is None else min(self.low, low)
+                self.high = high if self.high is None else max(self.high, high)
+        elif pa.types.is_floating(self.type) and self.single:
+            self.single = fits_float32(numeric_values(column))
+        elif self.is_string() and self.levels is not None:
+            for entry in pc.value_counts(column.drop_null()).to_pylist():
+                value = entry["values"]
+                self.levels[value] = self.levels.get(value, 0) + entry["counts"]
+            if len(self.levels) > CATEGORY_MAX_LEVELS:
+                self.levels = None
+        if self.aggregate:
+            self.aggregate.update(numeric_values(column))
+
+    def is_string(self):
+        return pa.types.is_string(self.type) or pa.types.is_large_string(self.type)
+
+    def compact_type(self, rows):
+        """Same choice compact_column makes, from the whole file's bounds"""
+        if pa.types.is_integer(self.type) and self.low is not None:
+            return integer_type(self.low, self.high) or self.type
+        if pa.types.is_floating(self.type) and self.single:
+            return pa.float32()
+        if (
+            self.is_string()
+            and self.levels is not None
+            and len(self.levels) <= CATEGORY_MAX_RATIO * rows
+        ):
+            return pa.dictionary(pa.int32(), self.type)
+        return self.type
+
+
+def csv_batches(path: str, column_types=None, progress=None):
+    """Record batches of a CSV file, `progress(read, size)` in bytes after each"""
+    size = os.path.getsize(path)
+    with open(path, "rb") as source:
+        reader = pacsv.open_csv(
+            source,
+            read_options=pacsv.ReadOptions(
+                use_threads=True, block_size=CSV_BLOCK_BYTES
+            ),
+            convert_options=pacsv.ConvertOptions(
+                column_types=column_types or {}, strings_can_be_null=True
+            ),
+        )
+        for batch in reader:
+            yield batch
+            if progress:
+                progress(min(source.tell(), size), size)
+
+
+def scan_csv(path: str, profile: bool, progress=None):
+    """
+    First pass of a streamed ingest. The streaming reader infers column types
+    from the first block only, so a column that fails to convert further down
+    is widened (integers to float, anything else to string) and the scan is
+    restarted.
+    """
+    column_types = {}
+    while True:
+        try:
+            scans, rows, parsed, incomplete = None, 0, 0, 0
+            for batch in csv_batches(path, column_types, progress):
+                if scans is None:
+                    schema = batch.schema
+                    scans = [ColumnScan(field, profile) for field in schema]
+                for scan, column in zip(scans, batch.columns):
+                    scan.update(column)
+                missing = [
+                    column.is_null().to_numpy(zero_copy_only=False)
+                    for scan, column in zip(scans, batch.columns)
+                    if scan.numeric
+                ]
+                if missing:
+                    incomplete += int(np.any(missing, axis=0).sum())
+                rows += batch.num_rows
+                parsed += batch.nbytes
+            return schema, scans, rows, parsed, incomplete
+        except pa.ArrowInvalid as e:
+            match = re.search(r"CSV column #(\d+)", str(e))
+            if scans is None or not match:
+                raise
+            field = schema.field(int(match.group(1)))
+            if field.name in column_types and column_types[field.name] == pa.string():
+                raise
+            widened = pa.float64() if pa.types.is_integer(field.type) else pa.string()
+            column_types[field.name] = widened
+
+
+def compact_batch(batch: pa.RecordBatch, schema: pa.Schema, dictionaries):
+    columns = []
+    for column, field in zip(batch.columns, schema):
+        if pa.types.is_dictionary(field.type):
+            indices = pc.index_in(column, value_set=dictionaries[field.name])
+            column = pa.DictionaryArray.from_arrays(
+                indices.cast(pa.int32()), dictionaries[field.name]
+            )
+        elif column.type != field.type:
+            column = column.cast(field.type, safe=False)
+        columns.append(column)
+    return pa.RecordBatch.from_arrays(columns, schema=schema)
+
+
+def stream_profile(schema: pa.Schema, scans, rows, incomplete):
+    """
+    Same shape as profile_frame, built from the scan. Numeric quantiles and
+    modes are sketch estimates and cardinality is only known for columns
+    with few distinct values.
+    """
+    dtypes = schema.empty_table().to_pandas().dtypes
+    columns = {}
+    for field, scan in zip(schema, scans):
+        if scan.aggregate:
+            summary = scan.aggregate.summary()
+            columns[field.name] = {
+                "dtype": str(dtypes[field.name]),
+                "nulls": scan.nulls,
+                "cardinality": None,
+                **{
+                    name: summary[name]
+                    for name in ["mode", "min", "max", "mean", "std", "quantiles"]
+                },
+            }
+        else:
+            levels = scan.levels if scan.is_string() else None
+            columns[field.name] = {
+                "dtype": str(dtypes[field.name]),
+                "nulls": scan.nulls,
+                "cardinality": len(levels) if levels is not None else None,
+                "mode": max(levels, key=levels.get) if levels else None,
+            }
+    return {
+        "rows": rows,
+        "completeRows": rows - incomplete,
+        "numericColumns": [
+            field.name for field, scan in zip(schema, scans) if scan.numeric
+        ],
+        "columns": columns,
+        "streamed": True,
+    }
+
+
+def stream_ingest_csv(key: str, path: str, profile=True, progress=None):
+    """
+    Ingest a CSV too large to parse at once in two passes over its blocks:
+    the first finds the compact type of every column (and profiles it), the
+    second casts each block and appends it to the stored dataset.
+    `progress(done, total)` counts the bytes read by both passes.
+    """
+
+    def scan_progress(read, size):
+        progress(read, 2 * size)
+
+    def store_progress(read, size):
+        progress(size + read, 2 * size)
+
+    schema, scans, rows, parsed, incomplete = scan_csv(
+        path, profile, progress and scan_progress
+    )
+    compact = pa.schema(
+        [
+            pa.field(field.name, scan.compact_type(rows))
+            for field, scan in zip(schema, scans)
+        ]
+    )
+    dictionaries = {
+        field.name: pa.array(sorted(scan.levels), type=scan.type)
+        for field, scan in zip(compact, scans)
+        if pa.types.is_dictionary(field.type)
+    }
+    stored = 0
+    for field, scan in zip(compact, scans):
+        if pa.types.is_dictionary(field.type):
+            stored += rows * 4 + dictionaries[field.name].nbytes
+        elif scan.numeric:
+            stored += rows * field.type.bit_width // 8
+            stored += (rows + 7) // 8 if scan.nulls else 0
+        else:
+            stored += scan.bytes
+    info = {"memory": {"parsedBytes": parsed, "storedBytes": stored}}
+    if profile:
+        info["profile"] = stream_profile(compact, scans, rows, incomplete)
+    column_types = {field.name: field.type for field in schema}
+    batches = (
+        compact_batch(batch, compact, dictionaries)
+        for batch in csv_batches(path, column_types, progress and store_progress)
+    )
+    put_batches(key, compact, batches, info)
+    return info
+
+
+def ingest_csv(key: str, source, profile=True, progress=None):
+    """
+    Parse, profile and store an uploaded CSV under its dataset id. Large files
+    report `progress(done, total)` while they are streamed in.
+    """
+    if isinstance(source, str) and os.path.getsize(source) > STREAM_INGEST_BYTES:
+        return stream_ingest_csv(key, source, profile, progress)
+    table, memory = read_csv_compact(source)
+    info = {"memory": memory}
+    if profile:
+        info["profile"] = profile_frame(table.to_pandas())
+    put_table(key, table, info)
+    return info
+
+
+def format_bytes(size):
+    for unit in ["B", "KB", "MB", "GB"]:
+        if size < 1024 or unit == "GB":
+            return f"{size:.1f} {unit}" if unit != "B" else f"{size} {unit}"
+        size /= 1024
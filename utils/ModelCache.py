@@ -0,0 +1,59 @@
+import os
+import json
+import hashlib
+import joblib
+from utils.DatasetStore import evict_lru, temp_path
+from utils.FrameCache import frames
+
+# Trained models with their predictions and reports, kept in worker memory
+# and on disk under a hash of the dataset and the training configuration
+MODEL_DIR = os.path.join("./cache", "models")
+MODEL_SIZE_LIMIT = int(os.environ.get("MODEL_CACHE_BYTES", 1024**3))
+
+os.makedirs(MODEL_DIR, exist_ok=True)
+
+
+def model_key(dataset: str, config: dict):
+    text = json.dumps({"dataset": dataset, **config}, sort_keys=True, default=str)
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+def model_path(digest: str):
+    return os.path.join(MODEL_DIR, f"{digest}.joblib")
+
+
+def get_trained(dataset: str, config: dict):
+    """Result stored for this configuration, None when it was never trained"""
+    digest = model_key(dataset, config)
+    result = frames.get((dataset, "model", digest))
+    if result is not None:
+        return result
+    path = model_path(digest)
+    try:
+        os.utime(path)  # mark as recently used for eviction
+        result = joblib.load(path)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print("Error loading cached model", path, e)
+        return None
+    return remember(dataset, digest, result, path)
+
+
+def put_trained(dataset: str, config: dict, result):
+    digest = model_key(dataset, config)
+    path = model_path(digest)
+    tmp_path = temp_path(path)
+    joblib.dump(result, tmp_path)
+    os.replace(tmp_path, path)
+    evict_lru(MODEL_DIR, ".joblib", MODEL_SIZE_LIMIT, keep=path)
+    return remember(dataset, digest, result, path)
+
+
+def remember(dataset: str, digest: str, result, path: str):
+    """Keep a result in worker memory, charged the size of its joblib file"""
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        size = None
+    return frames.put((dataset, "model", digest), result, size)
@@ -0,0 +1,111 @@
+import warnings
+import numpy as np
+import pandas as pd
+
+QUANTILES = [0.25, 0.5, 0.75]
+
+
+def json_value(value):
+    """Plain python value for the profile, NaN becomes None"""
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return None
+    if isinstance(value, np.generic):
+        return json_value(value.item())
+    if isinstance(value, (int, float, str, bool)):
+        return value
+    return str(value)
+
+
+def sorted_runs(values: np.ndarray):
+    """Cardinality and most frequent value of an already sorted 1-D array"""
+    if values.size == 0:
+        return 0, None
+    starts = np.flatnonzero(np.r_[True, values[1:] != values[:-1]])
+    lengths = np.diff(np.r_[starts, values.size])
+    return starts.size, values[starts[lengths.argmax()]]
+
+
+def profile_numeric(numeric: pd.DataFrame):
+    """
+    Per column stats of the numeric columns from a single sort of the matrix.
+    NaN sorts to the end of each column so the valid values stay in front.
+    """
+    X = numeric.to_numpy(dtype=np.float64, na_value=np.nan)
+    n = X.shape[0]
+    missing = np.isnan(X)
+    nulls = missing.sum(axis=0)
+    valid = n - nulls
+    # A row of NaN keeps the rank lookups below valid for an empty frame
+    ordered = np.sort(X, axis=0) if n else np.full((1, X.shape[1]), np.nan)
+    cols = np.arange(X.shape[1])
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        means = np.nanmean(X, axis=0)
+        stds = np.nanstd(X, axis=0, ddof=1)
+
+    # Linear interpolation between the closest ranks, same as np.quantile
+    quantiles = {}
+    for q in QUANTILES:
+        position = q * np.maximum(valid - 1, 0)
+        low = np.floor(position).astype(int)
+        high = np.ceil(position).astype(int)
+        fraction = position - low
+        values = (
+            ordered[low, cols] + (ordered[high, cols] - ordered[low, cols]) * fraction
+        )
+        quantiles[f"{q:.0%}"] = np.where(valid > 0, values, np.nan)
+
+    profile = {}
+    for j, name in enumerate(numeric.columns):
+        count = int(valid[j])
+        cardinality, mode = sorted_runs(ordered[:count, j])
+        profile[str(name)] = {
+            "dtype": str(numeric.dtypes.iloc[j]),
+            "nulls": int(nulls[j]),
+            "cardinality": cardinality,
+            "mode": json_value(mode),
+            "min": json_value(ordered[0, j]) if count else None,
+            "max": json_value(ordered[count - 1, j]) if count else None,
+            "mean": json_value(means[j]),
+            "std": json_value(stds[j]),
+            "quantiles": {
+                key: json_value(values[j]) for key, values in quantiles.items()
+            },
+        }
+    incomplete = int(missing.any(axis=1).sum()) if X.shape[1] else 0
+    return profile, incomplete
+
+
+def profile_other(series: pd.Series):
+    counts = series.value_counts(dropna=True)
+    counts = counts[counts > 0]  # unused categories are listed with 0
+    return {
+        "dtype": str(series.dtype),
+        "nulls": int(series.isna().sum()),
+        "cardinality": int(counts.size),
+        "mode": json_value(counts.index[0]) if counts.size else None,
+    }
+
+
+def profile_frame(df: pd.DataFrame):
+    """
+    Upload time profile of a dataset: per column dtype, null count,
+    cardinality and mode, plus min/max/mean/std/quantiles for numeric columns.
+    Incomplete rows are the ones dropped by select_dtypes("number").dropna().
+    """
+    numeric = df.select_dtypes(include="number")
+    numeric_profile, incomplete = profile_numeric(numeric)
+    columns = {}
+    for name in df.columns:
+        if str(name) in numeric_profile:
+            columns[str(name)] = numeric_profile[str(name)]
+        else:
+            columns[str(name)] = profile_other(df[name])
+    return {
+        "rows": int(df.shape[0]),
+        "completeRows": int(df.shape[0] - incomplete),
+        "numericColumns": [str(name) for name in numeric.columns],
+        "columns": columns,
+    }
+
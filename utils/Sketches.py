@@ -0,0 +1,132 @@
+import numpy as np
+
+
+class KLLSketch:
+    """
+    Mergeable quantile sketch (Karnin, Lang & Liberty). Keeps about 3k values
+    whatever the stream length, and the rank of a returned quantile is off by
+    roughly `error` * n with high probability.
+    """
+
+    def __init__(self, k=200, seed=None):
+        self.k = k
+        self.n = 0
+        self.levels = [np.empty(0)]  # a value at level h stands for 2**h values
+        self.rng = np.random.default_rng(seed)
+
+    @classmethod
+    def for_error(cls, error, seed=None):
+        return cls(k=max(8, int(np.ceil(1.7 / error))), seed=seed)
+
+    def capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(2, int(np.ceil(self.k * (2 / 3) ** depth)))
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        self.n += values.size
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self.compress()
+        return self
+
+    def merge(self, other: "KLLSketch"):
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, values in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], values])
+        self.n += other.n
+        self.compress()
+        return self
+
+    def compress(self):
+        """Halve every level over capacity, promoting every other sorted value"""
+        compacted = True
+        while compacted:
+            compacted = False
+            for level in range(len(self.levels)):
+                values = self.levels[level]
+                if values.size <= self.capacity(level):
+                    continue
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                values = np.sort(values)
+                # An odd value out stays behind so the total weight is kept
+                leftover = values[values.size - values.size % 2 :]
+                paired = values[: values.size - values.size % 2]
+                promoted = paired[self.rng.integers(2) :: 2]
+                self.levels[level + 1] = np.concatenate(
+                    [self.levels[level + 1], promoted]
+                )
+                self.levels[level] = leftover
+                compacted = True
+
+    def quantiles(self, qs):
+        values = np.concatenate(self.levels)
+        if values.size == 0:
+            return np.full(len(qs), np.nan)
+        weights = np.concatenate(
+            [
+                np.full(level.size, 2**h, dtype=np.float64)
+                for h, level in enumerate(self.levels)
+            ]
+        )
+        order = np.argsort(values, kind="stable")
+        ranks = np.cumsum(weights[order])
+        positions = np.searchsorted(ranks, np.asarray(qs) * ranks[-1], side="left")
+        return values[order][np.minimum(positions, values.size - 1)]
+
+    def quantile(self, q):
+        return self.quantiles([q])[0]
+
+
+class HeavyHitters:
+    """
+    Mergeable Misra-Gries frequency summary. Tracks at most `size` values and
+    under-counts any value by at most n / (size + 1), so a value that makes up
+    more than that share of the stream is never missed.
+    """
+
+    def __init__(self, size=100):
+        self.size = size
+        self.n = 0
+        self.values = np.empty(0)
+        self.counts = np.empty(0, dtype=np.int64)
+
+    @classmethod
+    def for_error(cls, error):
+        return cls(size=max(1, int(np.ceil(1 / error))))
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        unique, counts = np.unique(values, return_counts=True)
+        self.n += values.size
+        return self._add(unique, counts)
+
+    def merge(self, other: "HeavyHitters"):
+        self.n += other.n
+        return self._add(other.values, other.counts)
+
+    def _add(self, values, counts):
+        values = np.concatenate([self.values, values])
+        counts = np.concatenate([self.counts, counts])
+        unique, inverse = np.unique(values, return_inverse=True)
+        counts = np.bincount(inverse, weights=counts).astype(np.int64)
+        if unique.size > self.size:
+            # Subtract the (size + 1)-th largest count and drop what hits zero
+            cut = np.partition(counts, -(self.size + 1))[-(self.size + 1)]
+            counts = counts - cut
+            keep = counts > 0
+            unique, counts = unique[keep], counts[keep]
+        self.values, self.counts = unique, counts
+        return self
+
+    def mode(self):
+        if self.values.size == 0:
+            return np.nan
+        return self.values[self.counts.argmax()]
+
+    def error(self):
+        """Largest possible under-count of any reported frequency"""
+        return self.n / (self.size + 1)
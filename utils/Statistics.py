@@ -0,0 +1,116 @@
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+from utils.DatasetStore import has_dataset, iter_chunks
+from utils.FrameCache import frames, load_profile, numeric_frame
+from utils.Sketches import KLLSketch, HeavyHitters
+
+STATISTICS = ["mean", "median", "mode"]
+
+
+def sorted_modes(ordered: np.ndarray):
+    """
+    Most frequent value of every column of an already sorted matrix,
+    the smallest one on ties like DataFrame.mode().
+    """
+    n, c = ordered.shape
+    flat = ordered.T.ravel()
+    is_start = np.ones(flat.size, dtype=bool)
+    is_start[1:] = flat[1:] != flat[:-1]
+    is_start[::n] = True  # every column starts a new run
+    starts = np.flatnonzero(is_start)
+    lengths = np.diff(np.r_[starts, flat.size])
+    columns = starts // n
+    # Longest run first within each column, earliest (smallest) value on ties
+    order = np.lexsort((starts, -lengths, columns))
+    first = order[np.r_[True, columns[order][1:] != columns[order][:-1]]]
+    return flat[starts[first]]
+
+
+def aggregate(values: np.ndarray):
+    """Mean, median and mode of every column from one sort of the matrix"""
+    n = values.shape[0]
+    if n == 0 or values.shape[1] == 0:
+        empty = np.full(values.shape[1], np.nan)
+        return {"mean": empty, "median": empty, "mode": empty}
+    ordered = np.sort(values, axis=0)
+    middle = n // 2
+    median = ordered[middle] if n % 2 else (ordered[middle - 1] + ordered[middle]) / 2
+    return {
+        "mean": values.mean(axis=0),
+        "median": median,
+        "mode": sorted_modes(ordered),
+    }
+
+
+def selection_statistics(key: str, use_row: bool, values):
+    """
+    Mean, median and mode of the selected rows (each row over its columns)
+    or selected columns, as Series indexed by the selection. All three are
+    computed together and memoized per dataset, orientation and selection,
+    so switching statistic is only a lookup.
+    """
+    clean_df = numeric_frame(key)
+    if clean_df is None:
+        return None
+    values = list(values or [])
+    digest = hashlib.sha1(json.dumps(values, default=str).encode()).hexdigest()
+
+    def build():
+        if use_row:
+            selected = clean_df.loc[clean_df.index.intersection(values)]
+            labels = selected.index
+            matrix = selected.to_numpy(dtype=np.float64).T
+        else:
+            selected = clean_df[[col for col in values if col in clean_df.columns]]
+            labels = selected.columns
+            matrix = selected.to_numpy(dtype=np.float64)
+        return {
+            name: pd.Series(result, index=labels)
+            for name, result in aggregate(matrix).items()
+        }
+
+    return frames.get_or_build((key, "statistics", bool(use_row), digest), build)
+
+
+def approximate_statistics(key: str, values, error=0.01):
+    """
+    Column statistics with the median from a KLL sketch (rank error about
+    `error`) and the mode from a Misra-Gries summary, fed one stored chunk at
+    a time so the dataset is never loaded, sorted or hashed whole. Rows with a
+    missing numeric value are skipped as in numeric_frame. The mean stays exact.
+    """
+    profile = load_profile(key)
+    if profile is None or not has_dataset(key):
+        return None
+    values = list(values or [])
+    digest = hashlib.sha1(json.dumps(values, default=str).encode()).hexdigest()
+
+    def build():
+        numeric = profile["numericColumns"]
+        columns = [col for col in values if col in numeric]
+        quantiles = {col: KLLSketch.for_error(error, seed=0) for col in columns}
+        frequent = {col: HeavyHitters.for_error(error) for col in columns}
+        totals = {col: 0.0 for col in columns}
+        rows = 0
+        if columns:
+            for batch in iter_chunks(key, numeric):
+                chunk = batch.to_pandas().dropna()
+                rows += len(chunk)
+                for col in columns:
+                    column = chunk[col].to_numpy(dtype=np.float64)
+                    quantiles[col].update(column)
+                    frequent[col].update(column)
+                    totals[col] += column.sum()
+        result = {
+            "mean": [totals[col] / rows if rows else np.nan for col in columns],
+            "median": [quantiles[col].quantile(0.5) for col in columns],
+            "mode": [frequent[col].mode() for col in columns],
+        }
+        return {
+            name: pd.Series(result[name], index=pd.Index(columns), dtype=np.float64)
+            for name in STATISTICS
+        }
+
+    return frames.get_or_build((key, "sketch", digest, error), build)
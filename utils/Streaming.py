@@ -0,0 +1,111 @@
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+from utils.DatasetStore import count_chunks, has_dataset, iter_chunks
+from utils.Profile import QUANTILES, json_value
+from utils.Sketches import KLLSketch, HeavyHitters
+
+
+class ColumnAggregate:
+    """
+    Mergeable summary of one numeric column: count, nulls, sum, min and max,
+    mean and variance (per chunk, combined with Chan's update of Welford's
+    running mean) plus the quantile and heavy hitter sketches.
+    """
+
+    def __init__(self, error=0.01):
+        self.count = 0
+        self.nulls = 0
+        self.total = 0.0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+        self.quantiles = KLLSketch.for_error(error, seed=0)
+        self.frequent = HeavyHitters.for_error(error)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        missing = np.isnan(values)
+        valid = values[~missing]
+        self.nulls += int(missing.sum())
+        if valid.size:
+            mean = valid.mean()
+            self._combine(
+                valid.size,
+                valid.sum(),
+                mean,
+                np.square(valid - mean).sum(),
+                valid.min(),
+                valid.max(),
+            )
+            self.quantiles.update(valid)
+            self.frequent.update(valid)
+        return self
+
+    def merge(self, other: "ColumnAggregate"):
+        self.nulls += other.nulls
+        if other.count:
+            self._combine(
+                other.count, other.total, other.mean, other.m2, other.min, other.max
+            )
+        self.quantiles.merge(other.quantiles)
+        self.frequent.merge(other.frequent)
+        return self
+
+    def _combine(self, count, total, mean, m2, low, high):
+        n = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / n
+        self.m2 += m2 + delta**2 * self.count * count / n
+        self.count = n
+        self.total += total
+        self.min = min(self.min, low)
+        self.max = max(self.max, high)
+
+    def summary(self):
+        """JSON friendly result, quantiles and mode are the sketch estimates"""
+        quantiles = self.quantiles.quantiles(QUANTILES)
+        return {
+            "count": self.count,
+            "nulls": self.nulls,
+            "sum": json_value(self.total),
+            "mean": json_value(self.mean) if self.count else None,
+            "std": (
+                json_value(np.sqrt(self.m2 / (self.count - 1)))
+                if self.count > 1
+                else None
+            ),
+            "min": json_value(self.min) if self.count else None,
+            "max": json_value(self.max) if self.count else None,
+            "quantiles": {
+                f"{q:.0%}": json_value(value) for q, value in zip(QUANTILES, quantiles)
+            },
+            "mode": json_value(self.frequent.mode()),
+        }
+
+
+def numeric_values(column):
+    """Float64 numpy view of an Arrow numeric column, nulls become NaN"""
+    return pc.cast(column, pa.float64()).to_numpy(zero_copy_only=False)
+
+
+def stream_statistics(key: str, columns, error=0.01, progress=None):
+    """
+    Summaries of the given numeric columns of a stored dataset, computed one
+    chunk at a time so the dataset never has to fit in memory. Each column
+    keeps all of its own values, missing values in other columns don't drop
+    the row. `progress(done, total)` is called after every chunk.
+    Returns None when the dataset is gone.
+    """
+    if not has_dataset(key):
+        return None
+    columns = list(columns)
+    total = count_chunks(key)
+    aggregates = {col: ColumnAggregate(error) for col in columns}
+    for done, batch in enumerate(iter_chunks(key, columns), start=1):
+        for col in columns:
+            aggregates[col].update(numeric_values(batch.column(col)))
+        if progress:
+            progress(done, total)
+    return {col: aggregate.summary() for col, aggregate in aggregates.items()}